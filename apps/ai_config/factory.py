@@ -4,7 +4,7 @@ AI服务工厂模式实现
 import logging
 from typing import Dict, Any, Optional, Type
 from abc import ABC, abstractmethod
-from .services import AIServiceManager, ai_service_manager
+from .services import AIServiceManager, ai_service_manager, ai_http_session
 from .models import AIServiceUsageLog
 from .monitoring import ai_monitor, ai_error_handler, monitor_ai_service, log_ai_operation
 from django.utils import timezone
@@ -74,7 +74,6 @@ class GeminiAIService(BaseAIService):
     @monitor_ai_service('gemini_api')
     def process_request(self, request_data: Dict[str, Any]) -> Dict[str, Any]:
         """处理Gemini API请求"""
-        import requests
         import time
 
         start_time = time.time()
@@ -90,7 +89,7 @@ class GeminiAIService(BaseAIService):
             payload = self._build_gemini_payload(request_data)
             
             # 发送请求
-            response = requests.post(
+            response = ai_http_session.post(
                 url,
                 headers=headers,
                 json=payload,
@@ -209,7 +208,6 @@ class OpenAIAIService(BaseAIService):
     @monitor_ai_service('openai_api')
     def process_request(self, request_data: Dict[str, Any]) -> Dict[str, Any]:
         """处理OpenAI API请求"""
-        import requests
         import time
 
         start_time = time.time()
@@ -225,7 +223,7 @@ class OpenAIAIService(BaseAIService):
             payload = self._build_openai_payload(request_data)
             
             # 发送请求
-            response = requests.post(
+            response = ai_http_session.post(
                 url,
                 headers=headers,
                 json=payload,
@@ -394,12 +392,13 @@ class AIServiceFactory:
                 # 清除该用户缓存
                 self._current_service_by_user.pop(user_key, None)
         
+        # 配置快照在任一进程失效缓存后才会被替换，快照未变时复用已创建的服务实例
+        config = self.service_manager.get_current_service_config(user=user)
         cached = self._current_service_by_user.get(user_key)
-        if cached:
+        if cached and cached.config is config:
             return cached
 
-        # 如果没有缓存的服务，创建新的
-        config = self.service_manager.get_current_service_config(user=user)
+        # 如果没有缓存的服务或配置已变化，创建新的
         if not config:
             raise Exception("没有可用的AI服务配置")
 
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.23 on 2026-10-16 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ai_config", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="aiserviceusagelog",
+            index=models.Index(
+                condition=models.Q(("is_success", True)),
+                fields=["created_at"],
+                name="log_success_created_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.23 on 2026-10-16 10:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ai_config", "0002_aiserviceusagelog_log_success_created_idx"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="aiserviceusagelog",
+            index=models.Index(
+                fields=["-created_at", "config", "is_success"],
+                name="log_created_config_success_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.23 on 2026-10-16 11:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ai_config", "0003_aiserviceusagelog_log_created_config_success_idx"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="aiserviceconfig",
+            index=models.Index(
+                fields=["created_by", "is_active", "priority"],
+                name="config_owner_active_prio_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="aiconfighistory",
+            index=models.Index(
+                fields=["config", "-created_at"],
+                name="history_config_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="aiconfighistory",
+            index=models.Index(
+                fields=["user", "-created_at"],
+                name="history_user_created_idx",
+            ),
+        ),
+    ]
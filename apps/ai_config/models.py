@@ -104,6 +104,13 @@ class AIServiceConfig(BaseModel):
         ordering = ['priority', '-created_at']
         verbose_name = 'AI服务配置'
         verbose_name_plural = 'AI服务配置'
+        indexes = [
+            # 配置列表按创建者隔离、按启用状态过滤并按优先级排序
+            models.Index(
+                fields=['created_by', 'is_active', 'priority'],
+                name='config_owner_active_prio_idx'
+            ),
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=['is_default'],
@@ -196,6 +203,11 @@ class AIConfigHistory(BaseModel):
         ordering = ['-created_at']
         verbose_name = 'AI配置变更历史'
         verbose_name_plural = 'AI配置变更历史'
+        indexes = [
+            # 历史列表按配置或操作用户过滤，按时间倒序
+            models.Index(fields=['config', '-created_at'], name='history_config_created_idx'),
+            models.Index(fields=['user', '-created_at'], name='history_user_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.config.name} - {self.get_action_display()} ({self.created_at})"
@@ -241,6 +253,17 @@ class AIServiceUsageLog(BaseModel):
             models.Index(fields=['config', '-created_at']),
             models.Index(fields=['service_type', '-created_at']),
             models.Index(fields=['is_success', '-created_at']),
+            # 日志列表按时间范围 + 配置 + 成功状态组合过滤并按时间倒序
+            models.Index(
+                fields=['-created_at', 'config', 'is_success'],
+                name='log_created_config_success_idx'
+            ),
+            # 统计接口只按时间范围统计成功数时走部分索引
+            models.Index(
+                fields=['created_at'],
+                condition=models.Q(is_success=True),
+                name='log_success_created_idx'
+            ),
         ]
 
     def __str__(self):
@@ -327,14 +327,16 @@ def get_system_health() -> Dict[str, Any]:
     """获取系统健康状态"""
     monitor = AIServiceMonitor()
     
-    # 获取所有活跃的AI配置
-    active_configs = AIServiceConfig.objects.filter(is_active=True)
+    # 获取所有活跃的AI配置（只需名称，一次查询同时得到总数）
+    active_names = list(
+        AIServiceConfig.objects.filter(is_active=True).values_list('name', flat=True)
+    )
     
     health_status = {
         'overall_status': 'healthy',
         'services': {},
         'summary': {
-            'total_services': active_configs.count(),
+            'total_services': len(active_names),
             'healthy_services': 0,
             'warning_services': 0,
             'critical_services': 0
@@ -342,9 +344,9 @@ def get_system_health() -> Dict[str, Any]:
         'timestamp': timezone.now().isoformat()
     }
     
-    for config in active_configs:
-        service_health = monitor.check_service_health(config.name)
-        health_status['services'][config.name] = service_health
+    for name in active_names:
+        service_health = monitor.check_service_health(name)
+        health_status['services'][name] = service_health
         
         # 统计服务状态
         status = service_health.get('status', 'unknown')
@@ -2,11 +2,28 @@
 AI配置序列化器
 """
 from rest_framework import serializers
+from django.db.models import Avg, Count, Q
 from django.core.validators import URLValidator
 from .models import AIServiceConfig, AIConfigHistory, AIServiceUsageLog
 from .services import AIServiceManager, ai_service_manager
 
 
+# 合法的 (提供商, API格式) 组合
+_VALID_PROVIDER_FORMATS = frozenset({
+    ('gemini', 'gemini'),
+    ('openai', 'openai'),
+    ('anthropic', 'gemini'),
+    ('anthropic', 'openai'),
+    ('custom', 'gemini'),
+    ('custom', 'openai'),
+})
+
+_PROVIDER_FORMAT_ERRORS = {
+    'gemini': "Gemini提供商必须使用Gemini格式",
+    'openai': "OpenAI提供商必须使用OpenAI格式",
+}
+
+
 class AIServiceConfigSerializer(serializers.ModelSerializer):
     """AI服务配置序列化器"""
     
@@ -107,10 +124,10 @@ class AIServiceTestSerializer(serializers.Serializer):
         provider = data.get('provider')
         api_format = data.get('api_format')
         
-        if provider == 'gemini' and api_format != 'gemini':
-            raise serializers.ValidationError("Gemini提供商必须使用Gemini格式")
-        elif provider == 'openai' and api_format != 'openai':
-            raise serializers.ValidationError("OpenAI提供商必须使用OpenAI格式")
+        if (provider, api_format) not in _VALID_PROVIDER_FORMATS:
+            raise serializers.ValidationError(
+                _PROVIDER_FORMAT_ERRORS.get(provider, "提供商与API格式不匹配")
+            )
         
         return data
     
@@ -228,17 +245,16 @@ class AIServiceStatsSerializer(serializers.Serializer):
         
         logs = AIServiceUsageLog.objects.filter(**filters)
         
-        total_requests = logs.count()
-        success_requests = logs.filter(is_success=True).count()
+        # 单次聚合，成功数分支可命中 log_success_created_idx 部分索引
+        stats = logs.aggregate(
+            total_requests=Count('id'),
+            success_requests=Count('id', filter=Q(is_success=True)),
+            avg_time=Avg('response_time_ms')
+        )
+        total_requests = stats['total_requests']
+        success_requests = stats['success_requests']
         failure_requests = total_requests - success_requests
-        
-        avg_response_time = logs.filter(
-            response_time_ms__isnull=False
-        ).aggregate(
-            avg_time=models.Avg('response_time_ms')
-        )['avg_time'] or 0
-        
-        from django.db import models
+        avg_response_time = stats['avg_time'] or 0
 
         return {
             'total_requests': total_requests,
@@ -1,22 +1,217 @@
 """
 AI配置管理服务
 """
-import json
+import hashlib
+import importlib
+import mmap
 import os
-import shutil
 import copy
+import functools
+from collections import OrderedDict
 from datetime import datetime
+from operator import itemgetter
 from pathlib import Path
-from typing import Dict, List, Optional, Any
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Dict, List, Mapping, Optional, Tuple, Any
+import requests
+from requests.adapters import HTTPAdapter
 from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import Case, IntegerField, Q, Value, When
 from django.utils import timezone
-from .models import AIServiceConfig, AIConfigHistory, AIServiceUsageLog
 import logging
 import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import orjson
+
+if TYPE_CHECKING:
+    from .models import AIServiceConfig
 
 logger = logging.getLogger(__name__)
 
+# 超过该大小（字节）的配置文件使用 mmap 读取
+CONFIG_MMAP_THRESHOLD = 64 * 1024
+
+# 内置默认配置使用的API密钥，环境变量在进程启动后不会变化（.env 已由 settings 加载）
+_DEFAULT_GEMINI_API_KEY = os.getenv('GEMINI_API_KEY', '')
+_DEFAULT_OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', '')
+
+# 配置文件必需字段
+_REQUIRED_CONFIG_FIELDS = frozenset({'version', 'default_service', 'services'})
+_REQUIRED_SERVICE_FIELDS = frozenset({'provider', 'api_format', 'api_base_url', 'api_key', 'model_name'})
+
+# 配置备份与旧备份清理在单个后台线程中串行执行
+_backup_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ai-config-backup')
+
+# AI服务调用与测试共用的HTTP会话，保持连接池避免每次请求都重新握手
+ai_http_session = requests.Session()
+ai_http_session.mount('https://', HTTPAdapter(pool_connections=20, pool_maxsize=20, max_retries=0))
+ai_http_session.mount('http://', HTTPAdapter(pool_connections=20, pool_maxsize=20, max_retries=0))
+ai_http_session.headers.update({'Content-Type': 'application/json'})
+
+# 按用户缓存当前服务配置的最大用户数
+USER_SERVICE_CACHE_SIZE = 1024
+
+# 跨进程共享缓存（Django cache）的有效期（秒）与版本号键
+SHARED_CACHE_TIMEOUT = 300
+_SHARED_VERSION_KEY = 'ai_config:version'
+
+# 共享缓存版本号的本地缓存有效期（秒）：其他进程的失效最多延迟这么久生效，
+# 换来热路径（每次OCR调用都会解析当前服务）不必每次往返共享缓存
+SHARED_VERSION_CHECK_TTL = 2.0
+
+# 本地缓存的版本号: user_key -> (读取时间, 组合版本号)；本进程递增版本号时清除
+_local_versions: Dict[str, Tuple[float, Optional[str]]] = {}
+# 本进程递增版本号的次数，读取期间发生过递增则不写入本地缓存（避免写回旧版本）
+_local_version_generation = 0
+
+# 可用服务列表缓存有效期（秒）
+AVAILABLE_SERVICES_CACHE_TTL = 2.0
+
+# _db_config_to_dict 实际用到的字段，查询时只取这些列
+_SERVICE_CONFIG_FIELDS = (
+    'id', 'name', 'provider', 'api_format', 'api_base_url', 'api_key',
+    'model_name', 'timeout_seconds', 'max_retries', 'extra_config',
+    'is_active', 'priority',
+)
+
+
+def _json_loads(data: bytes) -> Any:
+    """解析JSON字节串"""
+    return orjson.loads(data)
+
+
+def _json_dumps(obj: Any) -> bytes:
+    """序列化为带缩进的UTF-8 JSON字节串（配置文件格式）"""
+    return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+
+
+_SENTINEL = object()
+
+# 已确保存在的配置目录
+_ensured_config_dirs = set()
+
+_factory_module = None
+
+
+def _get_factory():
+    """延迟获取 factory 模块（factory 依赖本模块，不能在顶层导入）"""
+    global _factory_module
+    if _factory_module is None:
+        _factory_module = importlib.import_module('.factory', __package__)
+    return _factory_module
+
+
+def _version_keys(user_key: str) -> Tuple[str, str]:
+    """全局版本号键与该用户的版本号键"""
+    return _SHARED_VERSION_KEY, f'{_SHARED_VERSION_KEY}:{user_key}'
+
+
+def _shared_cache_version(user_key: str) -> Optional[str]:
+    """
+    读取全局与该用户的共享缓存版本号，返回组合版本，缓存不可用时返回 None
+
+    本地快照与共享缓存条目都按该版本区分：任一进程失效缓存（递增版本号）后，
+    其他进程的本地快照随之作废。读取结果在本地缓存 SHARED_VERSION_CHECK_TTL 秒，
+    本进程递增版本号时立即清除。
+    """
+    now = time.monotonic()
+    cached = _local_versions.get(user_key)
+    if cached and now - cached[0] < SHARED_VERSION_CHECK_TTL:
+        return cached[1]
+
+    generation = _local_version_generation
+    version = _fetch_shared_cache_version(user_key)
+    if generation == _local_version_generation:
+        if len(_local_versions) >= USER_SERVICE_CACHE_SIZE:
+            _local_versions.clear()
+        _local_versions[user_key] = (now, version)
+    return version
+
+
+def _fetch_shared_cache_version(user_key: str) -> Optional[str]:
+    """从共享缓存读取全局与该用户的版本号（一次往返）"""
+    keys = _version_keys(user_key)
+    try:
+        versions = cache.get_many(keys)
+        for key in keys:
+            if key not in versions:
+                # 版本号键不存在（首次使用、过期或被淘汰），换一个不会与旧条目冲突的新值
+                cache.add(key, time.time_ns(), None)
+                versions[key] = cache.get(key, 0)
+    except Exception as e:
+        logger.warning(f"读取AI配置共享缓存版本失败: {e}")
+        return None
+    return f'{versions[keys[0]]}.{versions[keys[1]]}'
+
+
+def _shared_cache_key(kind: str, user_key: str, version: str) -> str:
+    """按版本号生成共享缓存键"""
+    return f'ai_config:{kind}:{version}:{user_key}'
+
+
+def _shared_cache_get(kind: str, user_key: str, version: Optional[str]) -> Any:
+    """读取共享缓存"""
+    if version is None:
+        return None
+    try:
+        return cache.get(_shared_cache_key(kind, user_key, version))
+    except Exception as e:
+        logger.warning(f"读取AI配置共享缓存失败: {e}")
+        return None
+
+
+def _shared_cache_set(kind: str, user_key: str, value: Any, version: Optional[str]):
+    """写入共享缓存（值须为可 pickle 的普通 dict/list）"""
+    if version is None:
+        return
+    try:
+        cache.set(_shared_cache_key(kind, user_key, version), value, SHARED_CACHE_TIMEOUT)
+    except Exception as e:
+        logger.warning(f"写入AI配置共享缓存失败: {e}")
+
+
+def _bump_shared_cache_version(user_key: Optional[str] = None):
+    """递增版本号，使所有进程的缓存条目失效（指定用户时只失效该用户的条目）"""
+    global _local_version_generation
+    key = _SHARED_VERSION_KEY if user_key is None else _version_keys(user_key)[1]
+    try:
+        cache.incr(key)
+    except ValueError:
+        # 版本号键不存在（过期或被淘汰），换一个不会与旧条目冲突的新值
+        cache.set(key, time.time_ns(), None)
+    except Exception as e:
+        logger.warning(f"更新AI配置共享缓存版本失败: {e}")
+    finally:
+        # 共享版本号更新后再清除本地缓存，本进程随后的读取立即看到新版本
+        _local_version_generation += 1
+        if user_key is None:
+            _local_versions.clear()
+        else:
+            _local_versions.pop(user_key, None)
+
+
+def _freeze(obj: Any) -> Any:
+    """将配置递归转换为只读快照（dict -> MappingProxyType, list -> tuple）"""
+    if isinstance(obj, Mapping):
+        return MappingProxyType({k: _freeze(v) for k, v in obj.items()})
+    if isinstance(obj, (list, tuple)):
+        return tuple(_freeze(v) for v in obj)
+    return obj
+
+
+def _thaw(obj: Any) -> Any:
+    """将只读快照还原为可修改的 dict/list"""
+    if isinstance(obj, Mapping):
+        return {k: _thaw(v) for k, v in obj.items()}
+    if isinstance(obj, tuple):
+        return [_thaw(v) for v in obj]
+    return obj
+
+
 class AIConfigFileManager:
     """AI配置文件管理器"""
     
@@ -24,87 +219,219 @@ class AIConfigFileManager:
         self.config_dir = Path(settings.BASE_DIR) / 'config' / 'ai_configs'
         self.config_file = self.config_dir / 'ai_services.json'
         self.backup_dir = self.config_dir / 'backups'
+        # 解析结果缓存，按 (st_mtime_ns, st_size) 判断文件是否变化
+        self._cache = None
+        self._name_index = None
+        self._cache_key = None
+        self._cache_lock = threading.Lock()
+        self._default_config = None
+        # 活跃服务排序结果: (对应的配置对象, [(优先级, 服务名, 服务配置)])
+        self._active_services = None
+        # 最近一次验证通过的配置内容摘要
+        self._last_validated_hash = None
         self._ensure_directories()
     
     def _ensure_directories(self):
-        """确保配置目录存在"""
+        """确保配置目录存在（每个目录每进程只创建一次）"""
+        if self.config_dir in _ensured_config_dirs:
+            return
         self.config_dir.mkdir(parents=True, exist_ok=True)
         self.backup_dir.mkdir(parents=True, exist_ok=True)
+        _ensured_config_dirs.add(self.config_dir)
+    
+    def load_config(self, readonly: bool = False) -> Dict[str, Any]:
+        """加载配置文件
+
+        readonly=True 时直接返回缓存对象，调用方不得修改；否则返回深拷贝。
+        """
+        config, _ = self._load_cached()
+        return config if readonly else copy.deepcopy(config)
     
-    def load_config(self) -> Dict[str, Any]:
-        """加载配置文件"""
+    def _load_cached(self) -> Tuple[Dict[str, Any], Dict[str, Dict[str, Any]]]:
+        """返回缓存的配置及小写服务名索引，调用方不得修改返回值"""
         try:
-            if self.config_file.exists():
-                with open(self.config_file, 'r', encoding='utf-8') as f:
-                    config = json.load(f)
-                logger.info(f"成功加载AI配置文件: {self.config_file}")
-                return config
-            else:
+            try:
+                st = self.config_file.stat()
+            except FileNotFoundError:
                 logger.info("AI配置文件不存在，返回默认配置")
-                return self._get_default_config()
+                return self._get_default_config_cached()
+
+            key = (st.st_mtime_ns, st.st_size)
+            with self._cache_lock:
+                if key == self._cache_key:
+                    return self._cache, self._name_index
+
+            with open(self.config_file, 'rb') as f:
+                if st.st_size > CONFIG_MMAP_THRESHOLD:
+                    # 大文件直接映射给解析器，省去一次完整读入
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+                        config = orjson.loads(view)
+                else:
+                    config = _json_loads(f.read())
+            logger.info(f"成功加载AI配置文件: {self.config_file}")
+            name_index = self._build_name_index(config)
+
+            self._store_cache(config, key, name_index)
+            return config, name_index
         except Exception as e:
             logger.error(f"加载AI配置文件失败: {e}")
-            return self._get_default_config()
+            return self._get_default_config_cached()
+    
+    @staticmethod
+    def _build_name_index(config: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """构建小写服务名到服务配置的索引"""
+        return {name.lower(): service for name, service in config.get('services', {}).items()}
     
     def save_config(self, config: Dict[str, Any], backup: bool = True) -> bool:
         """保存配置文件"""
         try:
-            # 创建备份
-            if backup and self.config_file.exists():
-                self._create_backup()
-            
-            # 验证配置格式
-            self._validate_config(config)
-            
-            # 保存配置
-            with open(self.config_file, 'w', encoding='utf-8') as f:
-                json.dump(config, f, ensure_ascii=False, indent=2)
+            # 验证配置格式（内容与上次验证通过的相同则跳过）
+            data = _json_dumps(config)
+            digest = hashlib.blake2b(data, digest_size=8).digest()
+            if digest != self._last_validated_hash:
+                self._validate_config(config)
+                self._last_validated_hash = digest
             
-            logger.info(f"成功保存AI配置文件: {self.config_file}")
-            return True
+            return self._write_config(data, backup)
+        except Exception as e:
+            logger.error(f"保存AI配置文件失败: {e}")
+            return False
+    
+    def _save_config_trusted(self, config: Dict[str, Any], backup: bool = True) -> bool:
+        """保存基于已加载配置修改得到的配置
+
+        未改动的服务沿用已有配置，调用方负责验证改动的服务，这里只检查顶层字段。
+        """
+        try:
+            self._validate_config(config, check_services=False)
+            return self._write_config(_json_dumps(config), backup)
         except Exception as e:
             logger.error(f"保存AI配置文件失败: {e}")
             return False
     
-    def _create_backup(self):
-        """创建配置文件备份"""
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        backup_file = self.backup_dir / f'ai_services_{timestamp}.json'
-        shutil.copy2(self.config_file, backup_file)
-        logger.info(f"创建配置备份: {backup_file}")
+    def _write_config(self, data: bytes, backup: bool) -> bool:
+        """原子写入已序列化的配置"""
+        # 内容未变化时不备份也不写盘
+        try:
+            existing = self.config_file.read_bytes()
+        except FileNotFoundError:
+            existing = None
+        if existing == data:
+            logger.debug("AI配置内容未变化，跳过写入")
+            return True
+        
+        # 备份写入前的内容：优先硬链接旧文件（仅元数据操作，随后的 os.replace 不会改动旧 inode），
+        # 不支持硬链接时由后台线程写入字节副本
+        if backup and existing is not None:
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            try:
+                os.link(self.config_file, self.backup_dir / f'ai_services_{timestamp}.json')
+                backup_data = None
+            except OSError:
+                backup_data = existing
+            _backup_executor.submit(self._create_backup, backup_data, timestamp)
+        
+        # 先写同目录下的独立临时文件再原子替换，避免写入中断或并发保存导致配置损坏
+        tmp_file = self.config_dir / f'.ai_services_{os.getpid()}_{threading.get_ident()}.tmp'
+        try:
+            with open(tmp_file, 'wb') as f:
+                f.write(data)
+                if getattr(settings, 'AI_CONFIG_DURABLE_WRITE', False):
+                    f.flush()
+                    os.fsync(f.fileno())
+                st = os.fstat(f.fileno())
+            os.replace(tmp_file, self.config_file)
+        except BaseException:
+            try:
+                os.unlink(tmp_file)
+            except FileNotFoundError:
+                pass
+            raise
+        # 用刚写入的内容直接刷新缓存，下次读取无需重新解析
+        self._store_cache(_json_loads(data), (st.st_mtime_ns, st.st_size))
+        _bump_shared_cache_version()
+        
+        logger.info(f"成功保存AI配置文件: {self.config_file}")
+        return True
+    
+    def _store_cache(self, config: Dict[str, Any], key: Tuple[int, int],
+                     name_index: Optional[Dict[str, Dict[str, Any]]] = None):
+        """写入解析缓存"""
+        if name_index is None:
+            name_index = self._build_name_index(config)
+        with self._cache_lock:
+            self._cache = config
+            self._name_index = name_index
+            self._cache_key = key
+    
+    def _create_backup(self, data: Optional[bytes], timestamp: str):
+        """登记备份并清理旧备份（在后台线程执行），data 为 None 表示已通过硬链接创建"""
+        try:
+            name = f'ai_services_{timestamp}.json'
+            backup_file = self.backup_dir / name
+            if data is not None:
+                backup_file.write_bytes(data)
+            logger.info(f"创建配置备份: {backup_file}")
+            
+            # 清理旧备份（保留最近10个）
+            self._cleanup_old_backups()
+        except Exception as e:
+            logger.error(f"创建配置备份失败: {e}")
+    
+    def _get_backup_names(self) -> List[str]:
+        """
+        按时间升序排列的备份文件名
         
-        # 清理旧备份（保留最近10个）
-        self._cleanup_old_backups()
+        每次清理都重新扫描目录：其他进程或重启前写入的备份同样需要清理。
+        文件名中的 YYYYMMDD_HHMMSS 按字典序即时间序，只读目录项，无需逐个 stat()。
+        """
+        with os.scandir(self.backup_dir) as it:
+            return sorted(
+                entry.name for entry in it
+                if entry.name.startswith('ai_services_') and entry.name.endswith('.json')
+            )
     
     def _cleanup_old_backups(self, keep_count: int = 10):
         """清理旧备份文件"""
-        backup_files = sorted(
-            self.backup_dir.glob('ai_services_*.json'),
-            key=lambda x: x.stat().st_mtime,
-            reverse=True
-        )
+        backup_names = self._get_backup_names()
+        old_count = len(backup_names) - keep_count
+        if old_count <= 0:
+            return
+        
+        for name in backup_names[:old_count]:
+            try:
+                os.unlink(os.path.join(self.backup_dir, name))
+            except FileNotFoundError:
+                # 其他进程已清理
+                pass
         
-        for backup_file in backup_files[keep_count:]:
-            backup_file.unlink()
-            logger.info(f"删除旧备份: {backup_file}")
+        logger.info(f"删除 {old_count} 个旧备份")
     
-    def _validate_config(self, config: Dict[str, Any]):
+    def _validate_config(self, config: Dict[str, Any], check_services: bool = True):
         """验证配置格式"""
-        required_fields = ['version', 'default_service', 'services']
-        for field in required_fields:
-            if field not in config:
-                raise ValidationError(f"配置文件缺少必需字段: {field}")
+        # keys 视图的子集比较在 C 层完成，只有缺字段时才计算差集用于报错
+        if not _REQUIRED_CONFIG_FIELDS <= config.keys():
+            missing = _REQUIRED_CONFIG_FIELDS.difference(config.keys())
+            raise ValidationError(f"配置文件缺少必需字段: {', '.join(sorted(missing))}")
         
         # 验证服务配置
-        for service_name, service_config in config['services'].items():
-            self._validate_service_config(service_name, service_config)
+        if check_services:
+            for service_name, service_config in config['services'].items():
+                if not _REQUIRED_SERVICE_FIELDS <= service_config.keys():
+                    self._validate_service_config(service_name, service_config)
     
     def _validate_service_config(self, name: str, config: Dict[str, Any]):
         """验证单个服务配置"""
-        required_fields = ['provider', 'api_format', 'api_base_url', 'api_key', 'model_name']
-        for field in required_fields:
-            if field not in config:
-                raise ValidationError(f"服务 {name} 缺少必需字段: {field}")
+        if not _REQUIRED_SERVICE_FIELDS <= config.keys():
+            missing = _REQUIRED_SERVICE_FIELDS.difference(config.keys())
+            raise ValidationError(f"服务 {name} 缺少必需字段: {', '.join(sorted(missing))}")
+    
+    def _get_default_config_cached(self) -> Tuple[Dict[str, Any], Dict[str, Dict[str, Any]]]:
+        """默认配置及其名称索引只构建一次，调用方不得修改返回值"""
+        if self._default_config is None:
+            config = self._get_default_config()
+            self._default_config = (config, self._build_name_index(config))
+        return self._default_config
     
     def _get_default_config(self) -> Dict[str, Any]:
         """获取默认配置"""
@@ -118,7 +445,7 @@ class AIConfigFileManager:
                     "provider": "gemini",
                     "api_format": "gemini",
                     "api_base_url": "https://generativelanguage.googleapis.com",
-                    "api_key": os.getenv('GEMINI_API_KEY', ''),
+                    "api_key": _DEFAULT_GEMINI_API_KEY,
                     "model_name": "gemini-2.0-flash-exp-image-generation",
                     "timeout_seconds": 30,
                     "max_retries": 3,
@@ -130,7 +457,7 @@ class AIConfigFileManager:
                     "provider": "openai",
                     "api_format": "openai",
                     "api_base_url": "https://api.openai.com/v1",
-                    "api_key": os.getenv('OPENAI_API_KEY', ''),
+                    "api_key": _DEFAULT_OPENAI_API_KEY,
                     "model_name": "gpt-4o-mini",
                     "timeout_seconds": 30,
                     "max_retries": 3,
@@ -140,35 +467,61 @@ class AIConfigFileManager:
             }
         }
     
-    def get_service_config(self, service_name: str) -> Optional[Dict[str, Any]]:
-        """获取指定服务配置"""
-        config = self.load_config()
-        return config.get('services', {}).get(service_name)
+    def _get_service_config(self, config: Dict[str, Any], service_name: str,
+                            name_index: Optional[Dict[str, Dict[str, Any]]] = None) -> Optional[Dict[str, Any]]:
+        """从已加载的配置中获取指定服务配置，精确匹配失败时按小写名称查找"""
+        service = config.get('services', {}).get(service_name)
+        if service is None and name_index is not None:
+            service = name_index.get(service_name.lower())
+        return service
     
-    def get_default_service_config(self) -> Optional[Dict[str, Any]]:
-        """获取默认服务配置"""
-        config = self.load_config()
+    def _get_default_service_config(self, config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """从已加载的配置中获取默认服务配置"""
         default_service = config.get('default_service')
         if default_service:
-            return self.get_service_config(default_service)
+            return self._get_service_config(config, default_service)
         return None
     
+    def get_service_config(self, service_name: str) -> Optional[Dict[str, Any]]:
+        """获取指定服务配置（服务名不区分大小写）"""
+        config, name_index = self._load_cached()
+        return copy.deepcopy(self._get_service_config(config, service_name, name_index))
+    
+    def get_default_service_config(self) -> Optional[Dict[str, Any]]:
+        """获取默认服务配置"""
+        config, _ = self._load_cached()
+        return copy.deepcopy(self._get_default_service_config(config))
+    
     def get_active_services(self) -> List[Dict[str, Any]]:
-        """获取所有活跃的服务配置"""
-        config = self.load_config()
-        services = []
-        for name, service_config in config.get('services', {}).items():
-            if service_config.get('is_active', True):
-                service_config['service_name'] = name
-                services.append(service_config)
-        
-        # 按优先级排序
-        return sorted(services, key=lambda x: x.get('priority', 100))
+        """获取所有活跃的服务配置
+
+        排序结果随解析缓存一起复用；返回的条目为浅拷贝，不得修改其中的嵌套字段。
+        """
+        config = self.load_config(readonly=True)
+        cached = self._active_services
+        if cached is None or cached[0] is not config:
+            # 预先取出优先级，排序时不再逐次查字典
+            items = [
+                (service_config.get('priority', 100), name, service_config)
+                for name, service_config in config.get('services', {}).items()
+                if service_config.get('is_active', True)
+            ]
+            items.sort(key=itemgetter(0))
+            cached = (config, items)
+            self._active_services = cached
+        return [dict(service_config, service_name=name) for _, name, service_config in cached[1]]
+    
+    def _copy_for_update(self) -> Dict[str, Any]:
+        """复制缓存配置的顶层和服务表，供只替换/删除整个服务条目的修改使用"""
+        current = self.load_config(readonly=True)
+        config = dict(current)
+        config['services'] = dict(current.get('services', {}))
+        return config
     
     def add_service(self, service_name: str, service_config: Dict[str, Any]) -> bool:
         """添加新服务配置"""
         try:
-            config = self.load_config()
+            config = self._copy_for_update()
             
             # 验证服务配置
             self._validate_service_config(service_name, service_config)
@@ -176,8 +529,8 @@ class AIConfigFileManager:
             # 添加服务
             config['services'][service_name] = service_config
             
-            # 保存配置
-            return self.save_config(config)
+            # 保存配置（其余服务未改动，无需重新验证）
+            return self._save_config_trusted(config)
         except Exception as e:
             logger.error(f"添加服务配置失败: {e}")
             return False
@@ -185,7 +538,7 @@ class AIConfigFileManager:
     def update_service(self, service_name: str, service_config: Dict[str, Any]) -> bool:
         """更新服务配置"""
         try:
-            config = self.load_config()
+            config = self._copy_for_update()
             
             if service_name not in config['services']:
                 raise ValidationError(f"服务 {service_name} 不存在")
@@ -196,8 +549,8 @@ class AIConfigFileManager:
             # 更新服务
             config['services'][service_name] = service_config
             
-            # 保存配置
-            return self.save_config(config)
+            # 保存配置（其余服务未改动，无需重新验证）
+            return self._save_config_trusted(config)
         except Exception as e:
             logger.error(f"更新服务配置失败: {e}")
             return False
@@ -205,7 +558,7 @@ class AIConfigFileManager:
     def remove_service(self, service_name: str) -> bool:
         """删除服务配置"""
         try:
-            config = self.load_config()
+            config = self._copy_for_update()
             
             if service_name not in config['services']:
                 raise ValidationError(f"服务 {service_name} 不存在")
@@ -217,8 +570,8 @@ class AIConfigFileManager:
             # 删除服务
             del config['services'][service_name]
             
-            # 保存配置
-            return self.save_config(config)
+            # 保存配置（其余服务未改动，无需重新验证）
+            return self._save_config_trusted(config)
         except Exception as e:
             logger.error(f"删除服务配置失败: {e}")
             return False
@@ -226,28 +579,45 @@ class AIConfigFileManager:
     def set_default_service(self, service_name: str) -> bool:
         """设置默认服务"""
         try:
-            config = self.load_config()
+            current = self.load_config(readonly=True)
             
-            if service_name not in config['services']:
+            if service_name not in current['services']:
                 raise ValidationError(f"服务 {service_name} 不存在")
             
+            # 已是默认服务时无需复制和重写配置文件
+            if current.get('default_service') == service_name:
+                return True
+            
+            config = self._copy_for_update()
             config['default_service'] = service_name
-            return self.save_config(config)
+            return self._save_config_trusted(config)
         except Exception as e:
             logger.error(f"设置默认服务失败: {e}")
             return False
 
 
+@functools.lru_cache(maxsize=1)
+def get_file_manager() -> AIConfigFileManager:
+    """进程内共享的配置文件管理器，各服务管理器共用同一份解析缓存"""
+    return AIConfigFileManager()
+
+
 class AIServiceManager:
     """AI服务管理器 - 负责服务的动态切换和故障处理"""
 
     def __init__(self):
-        self.config_manager = AIConfigFileManager()
+        self.config_manager = get_file_manager()
         # 注意：不同用户可能配置不同的默认服务，必须隔离缓存
-        self._current_service = None  # 全局/无用户场景
-        self._current_service_by_user: Dict[str, Dict[str, Any]] = {}
+        # 当前服务快照均为 (共享缓存版本号, 配置)，版本号变化后不再使用
+        self._current_service: Optional[Tuple[Optional[str], Mapping[str, Any]]] = None  # 全局/无用户场景
+        # 按用户缓存的当前服务，LRU 淘汰，最多 USER_SERVICE_CACHE_SIZE 个用户
+        self._current_service_by_user: 'OrderedDict[str, Tuple[Optional[str], Mapping[str, Any]]]' = OrderedDict()
         self._service_cache = {}
-        self._lock = threading.RLock()
+        # 可用服务列表短时缓存: user_key -> (写入时间, 服务快照)
+        self._available_cache: Dict[str, Tuple[float, Tuple[Mapping[str, Any], ...]]] = {}
+        self._env_fallback_cached = _SENTINEL
+        # 锁只保护缓存字典的读写，不可重入，临界区内不得做 IO 或再次加锁
+        self._lock = threading.Lock()
 
     def clear_cache(self, user=None):
         with self._lock:
@@ -259,81 +629,129 @@ class AIServiceManager:
             if user is None:
                 self._current_service = None
                 self._current_service_by_user.clear()
+                self._available_cache.clear()
+                self._env_fallback_cached = _SENTINEL
             else:
                 user_key = str(getattr(user, 'pk', 'global') or 'global')
                 self._current_service_by_user.pop(user_key, None)
+                self._available_cache.pop(user_key, None)
+
+        # 递增版本号，其他进程的本地快照与共享缓存条目一并失效
+        _bump_shared_cache_version(None if user is None else user_key)
         
         try:
-            from .factory import ai_service_factory
+            ai_service_factory = _get_factory().ai_service_factory
             # 工厂侧也需要同步清缓存（支持按用户缓存）
             if hasattr(ai_service_factory, 'clear_cache'):
                 ai_service_factory.clear_cache(user=user)
         except Exception as e:
             logger.warning(f"同步清理工厂缓存失败: {e}", exc_info=True)
 
-    def get_current_service_config(self, user=None) -> Optional[Dict[str, Any]]:
-        """获取当前使用的服务配置"""
+    def invalidate(self, service_name: str, owner=None, is_default: bool = False):
+        """按单个配置定向失效缓存
+
+        默认配置会被所有用户作为回退使用，变更时整体失效；
+        其他配置只影响所有者的缓存以及全局（无用户）的当前服务与服务列表。
+        全局当前服务不按名称比较：配置改名后旧名称无法匹配，任何变更都直接失效。
+        """
+        logger.debug(f"失效AI配置缓存: {service_name}")
+        if is_default or owner is None:
+            self.clear_cache()
+            return
+
+        self.clear_cache(user=owner)
         with self._lock:
-            if user is None and self._current_service:
-                return copy.deepcopy(self._current_service)
-            if user is not None:
-                user_key = str(getattr(user, 'pk', 'global') or 'global')
-                cached = self._current_service_by_user.get(user_key)
-                if cached:
-                    return copy.deepcopy(cached)
+            self._available_cache.pop('global', None)
+            self._current_service = None
+        _bump_shared_cache_version('global')
+
+    def _set_user_service(self, user_key: str, cfg: Mapping[str, Any], version: Optional[str]):
+        """写入用户服务缓存并淘汰最久未使用的条目，调用方需持有 self._lock"""
+        self._current_service_by_user[user_key] = (version, cfg)
+        self._current_service_by_user.move_to_end(user_key)
+        while len(self._current_service_by_user) > USER_SERVICE_CACHE_SIZE:
+            self._current_service_by_user.popitem(last=False)
+
+    def _remember_service(self, cfg: Mapping[str, Any], user=None, version: Optional[str] = None,
+                          drop_available: bool = False):
+        """记录当前服务快照（附带读取时的共享缓存版本号），锁内只做字典读写"""
+        user_key = str(getattr(user, 'pk', 'global') or 'global')
+        with self._lock:
+            if user is None:
+                self._current_service = (version, cfg)
+            else:
+                self._set_user_service(user_key, cfg, version)
+            if drop_available:
+                self._available_cache.pop(user_key, None)
+
+    def _share_switched_service(self, plain: Dict[str, Any], user=None) -> Mapping[str, Any]:
+        """记录切换后的服务：递增该用户的版本号使各进程的旧快照失效，再按新版本写入缓存"""
+        user_key = str(getattr(user, 'pk', 'global') or 'global')
+        _bump_shared_cache_version(user_key)
+        version = _shared_cache_version(user_key)
+        _shared_cache_set('current', user_key, plain, version)
+        cfg = _freeze(plain)
+        self._remember_service(cfg, user, version, drop_available=True)
+        return cfg
+
+    def get_current_service_config(self, user=None) -> Optional[Mapping[str, Any]]:
+        """获取当前使用的服务配置
+
+        返回只读快照，调用方如需修改请使用 _thaw() 复制。
+        """
+        user_key = str(getattr(user, 'pk', 'global') or 'global')
+        # 先确认共享版本号，本地快照只在版本号未变化时可用
+        version = _shared_cache_version(user_key)
+        # 快照只在写入时整体替换（RCU），读取单个引用无需加锁
+        if user is None:
+            current = self._current_service
+            if current and current[0] == version:
+                return current[1]
+        else:
+            cached = self._current_service_by_user.get(user_key)
+            if cached and cached[0] == version:
+                with self._lock:
+                    if user_key in self._current_service_by_user:
+                        self._current_service_by_user.move_to_end(user_key)
+                return cached[1]
+
+        # 其他进程已解析过的配置
+        shared = _shared_cache_get('current', user_key, version)
+        if shared:
+            cfg = _freeze(shared)
+            self._remember_service(cfg, user, version)
+            return cfg
 
         # 尝试从数据库获取默认配置
         logger.debug("AIServiceManager: 开始从数据库获取默认AI配置...")
         try:
-            # 1) 优先：用户自己的默认配置
+            from .models import AIServiceConfig
+
+            queryset = AIServiceConfig.objects.filter(is_active=True).only(*_SERVICE_CONFIG_FIELDS)
             if user:
-                user_default = AIServiceConfig.objects.filter(
-                    is_active=True,
-                    is_default=True,
-                    created_by=user
-                ).order_by('priority').first()
-                if user_default:
-                    logger.debug(
-                        f"AIServiceManager: 命中用户默认配置: ID={user_default.id}, 名称='{user_default.name}'"
-                    )
-                    with self._lock:
-                        cfg = self._db_config_to_dict(user_default)
-                        user_key = str(getattr(user, 'pk', 'global') or 'global')
-                        self._current_service_by_user[user_key] = cfg
-                        return copy.deepcopy(cfg)
-
-                # 2) 其次：用户任意可用配置（按优先级）
-                user_any = AIServiceConfig.objects.filter(
-                    is_active=True,
-                    created_by=user
-                ).order_by('priority').first()
-                if user_any:
-                    logger.debug(
-                        f"AIServiceManager: 用户无默认配置，使用用户优先级最高配置: "
-                        f"ID={user_any.id}, 名称='{user_any.name}'"
+                # 单次查询按优先级取：1) 用户默认配置 2) 用户任意可用配置 3) 全局默认配置
+                db_config = queryset.filter(
+                    Q(created_by=user) | Q(is_default=True)
+                ).annotate(
+                    rank=Case(
+                        When(created_by=user, is_default=True, then=Value(0)),
+                        When(created_by=user, then=Value(1)),
+                        default=Value(2),
+                        output_field=IntegerField(),
                     )
-                    with self._lock:
-                        cfg = self._db_config_to_dict(user_any)
-                        user_key = str(getattr(user, 'pk', 'global') or 'global')
-                        self._current_service_by_user[user_key] = cfg
-                        return copy.deepcopy(cfg)
-
-            # 3) 全局默认配置（任意用户创建的默认）
-            db_config = AIServiceConfig.objects.filter(
-                is_active=True,
-                is_default=True
-            ).order_by('priority').first()
+                ).order_by('rank', 'priority').first()
+            else:
+                db_config = queryset.filter(is_default=True).order_by('priority').first()
 
             if db_config:
-                logger.debug(f"AIServiceManager: 成功从数据库找到默认配置: ID={db_config.id}, 名称='{db_config.name}'")
-                with self._lock:
-                    cfg = self._db_config_to_dict(db_config)
-                    if user is None:
-                        self._current_service = cfg
-                    else:
-                        user_key = str(getattr(user, 'pk', 'global') or 'global')
-                        self._current_service_by_user[user_key] = cfg
-                    return copy.deepcopy(cfg)
+                logger.debug(
+                    f"AIServiceManager: 成功从数据库找到配置: ID={db_config.id}, 名称='{db_config.name}'"
+                )
+                plain = self._db_config_to_dict(db_config)
+                _shared_cache_set('current', user_key, plain, version)
+                cfg = _freeze(plain)
+                self._remember_service(cfg, user, version)
+                return cfg
             else:
                 logger.debug("AIServiceManager: 数据库中没有找到激活的默认配置。")
         except Exception as e:
@@ -344,13 +762,10 @@ class AIServiceManager:
         file_config = self.config_manager.get_default_service_config()
         if file_config:
             logger.debug(f"AIServiceManager: 成功从JSON文件找到默认配置: 名称='{file_config.get('name')}'")
-            with self._lock:
-                if user is None:
-                    self._current_service = file_config
-                else:
-                    user_key = str(getattr(user, 'pk', 'global') or 'global')
-                    self._current_service_by_user[user_key] = file_config
-                return copy.deepcopy(file_config)
+            _shared_cache_set('current', user_key, file_config, version)
+            cfg = _freeze(file_config)
+            self._remember_service(cfg, user, version)
+            return cfg
         else:
             logger.debug("AIServiceManager: JSON配置文件中也没有找到默认配置。")
 
@@ -358,13 +773,30 @@ class AIServiceManager:
         logger.debug("AIServiceManager: 回退到环境变量配置。")
         return self._get_env_fallback_config()
 
-    def get_available_services(self, user=None) -> List[Dict[str, Any]]:
-        """获取所有可用的服务配置"""
+    def get_available_services(self, user=None) -> List[Mapping[str, Any]]:
+        """获取所有可用的服务配置（短时缓存，返回只读快照）"""
+        user_key = str(getattr(user, 'pk', 'global') or 'global')
+        now = time.monotonic()
+        # 读侧不加锁：dict.get 在 GIL 下是原子的，缓存值为不可变元组
+        cached = self._available_cache.get(user_key)
+        if cached and now - cached[0] < AVAILABLE_SERVICES_CACHE_TTL:
+            return list(cached[1])
+
+        version = _shared_cache_version(user_key)
+        shared = _shared_cache_get('available', user_key, version)
+        if shared is not None:
+            frozen = tuple(_freeze(service) for service in shared)
+            with self._lock:
+                self._available_cache[user_key] = (now, frozen)
+            return list(frozen)
+
         services = []
 
         # 从数据库获取配置
         try:
-            queryset = AIServiceConfig.objects.filter(is_active=True)
+            from .models import AIServiceConfig
+
+            queryset = AIServiceConfig.objects.filter(is_active=True).only(*_SERVICE_CONFIG_FIELDS)
             # 用户隔离：如果提供了用户，只查询该用户的配置
             if user:
                 queryset = queryset.filter(created_by=user)
@@ -379,11 +811,18 @@ class AIServiceManager:
         if not services:
             services = self.config_manager.get_active_services()
 
-        return services
+        if services:
+            _shared_cache_set('available', user_key, services, version)
+        frozen = tuple(_freeze(service) for service in services)
+        with self._lock:
+            self._available_cache[user_key] = (now, frozen)
+        return list(frozen)
 
     def switch_service(self, service_name: str, user=None) -> bool:
         """切换到指定服务"""
         try:
+            from .models import AIServiceConfig
+
             # 从数据库查找服务
             queryset = AIServiceConfig.objects.filter(
                 name=service_name,
@@ -396,16 +835,10 @@ class AIServiceManager:
             db_config = queryset.first()
 
             if db_config:
-                with self._lock:
-                    cfg = self._db_config_to_dict(db_config)
-                    if user is None:
-                        self._current_service = cfg
-                    else:
-                        user_key = str(getattr(user, 'pk', 'global') or 'global')
-                        self._current_service_by_user[user_key] = cfg
+                self._share_switched_service(self._db_config_to_dict(db_config), user)
                 self._log_service_switch(service_name, user, 'database')
                 try:
-                    from .factory import ai_service_factory
+                    ai_service_factory = _get_factory().ai_service_factory
                     # 工厂已改为按用户缓存，切换成功后必须清理对应用户缓存
                     if hasattr(ai_service_factory, 'clear_cache'):
                         ai_service_factory.clear_cache(user=user)
@@ -416,16 +849,11 @@ class AIServiceManager:
             # 从配置文件查找服务
             file_config = self.config_manager.get_service_config(service_name)
             if file_config and file_config.get('is_active', True):
-                with self._lock:
-                    if user is None:
-                        self._current_service = file_config
-                    else:
-                        user_key = str(getattr(user, 'pk', 'global') or 'global')
-                        self._current_service_by_user[user_key] = file_config
+                self._share_switched_service(file_config, user)
                 self._log_service_switch(service_name, user, 'file')
                 # 失效工厂缓存，确保下次获取到新实例
                 try:
-                    from .factory import ai_service_factory
+                    ai_service_factory = _get_factory().ai_service_factory
                     if hasattr(ai_service_factory, 'clear_cache'):
                         ai_service_factory.clear_cache(user=user)
                 except Exception as e:
@@ -439,7 +867,7 @@ class AIServiceManager:
             logger.error(f"切换服务失败: {e}")
             return False
 
-    def test_service(self, service_config: Dict[str, Any]) -> Dict[str, Any]:
+    def test_service(self, service_config: Mapping[str, Any]) -> Dict[str, Any]:
         """测试服务配置"""
         test_result = {
             'success': False,
@@ -448,9 +876,8 @@ class AIServiceManager:
             'test_time': timezone.now().isoformat()
         }
 
+        start_ns = time.perf_counter_ns()
         try:
-            start_time = timezone.now()
-
             # 根据API格式选择测试方法
             if service_config.get('api_format') == 'gemini':
                 result = self._test_gemini_service(service_config)
@@ -459,18 +886,13 @@ class AIServiceManager:
             else:
                 raise ValueError(f"不支持的API格式: {service_config.get('api_format')}")
 
-            end_time = timezone.now()
-            test_result['response_time_ms'] = int((end_time - start_time).total_seconds() * 1000)
+            test_result['response_time_ms'] = (time.perf_counter_ns() - start_ns) // 1_000_000
             test_result['success'] = True
             test_result.update(result)
 
         except Exception as e:
-            try:
-                end_time = timezone.now()
-                # 失败也记录耗时，便于前端展示“超时/快速失败”
-                test_result['response_time_ms'] = int((end_time - start_time).total_seconds() * 1000)
-            except Exception:
-                pass
+            # 失败也记录耗时，便于前端展示“超时/快速失败”
+            test_result['response_time_ms'] = (time.perf_counter_ns() - start_ns) // 1_000_000
             test_result['error_message'] = str(e)
             logger.error(f"服务测试失败: {e}")
 
@@ -485,32 +907,50 @@ class AIServiceManager:
 
         # 获取备用服务列表（按用户隔离）
         available_services = self.get_available_services(user=user)
-
+        candidates = []
         for service in available_services:
             service_name = service.get('service_name') or service.get('name')
             if service_name and service_name != failed_service:
-                logger.info(f"尝试切换到备用服务: {service_name}")
-
-                # 测试备用服务
-                test_result = self.test_service(service)
-                if test_result['success']:
-                    self.switch_service(service_name, user)
-                    logger.info(f"成功切换到备用服务: {service_name}")
-                    return service
-                else:
+                candidates.append((service_name, service))
+
+        if candidates:
+            # 并发测试备用服务，采用最先测试成功的服务
+            executor = ThreadPoolExecutor(max_workers=min(8, len(candidates)))
+            try:
+                futures = {}
+                for service_name, service in candidates:
+                    logger.info(f"尝试切换到备用服务: {service_name}")
+                    futures[executor.submit(self._probe_service, service)] = (service_name, service)
+
+                for future in as_completed(futures):
+                    service_name, service = futures[future]
+                    test_result = future.result()
+                    if test_result['success']:
+                        self.switch_service(service_name, user)
+                        logger.info(f"成功切换到备用服务: {service_name}")
+                        return service
                     logger.warning(f"备用服务 {service_name} 也不可用: {test_result['error_message']}")
+            finally:
+                # 不等待仍在进行的探测，直接取消尚未开始的任务
+                executor.shutdown(wait=False, cancel_futures=True)
 
         # 所有服务都不可用，回退到环境变量配置
         logger.error("所有配置的服务都不可用，回退到环境变量配置")
         env_config = self._get_env_fallback_config()
         if env_config:
-            with self._lock:
-                self._current_service = env_config
+            self._remember_service(env_config, version=_shared_cache_version('global'))
             return env_config
 
         return None
 
-    def _db_config_to_dict(self, db_config: AIServiceConfig) -> Dict[str, Any]:
+    def _probe_service(self, service_config: Mapping[str, Any]) -> Dict[str, Any]:
+        """在工作线程中测试服务，结束后释放该线程的数据库连接"""
+        try:
+            return self.test_service(service_config)
+        finally:
+            connections.close_all()
+
+    def _db_config_to_dict(self, db_config: 'AIServiceConfig') -> Dict[str, Any]:
         """将数据库配置转换为字典格式"""
         return {
             'id': db_config.pk,
@@ -527,8 +967,16 @@ class AIServiceManager:
             'priority': db_config.priority,
         }
 
-    def _get_env_fallback_config(self) -> Optional[Dict[str, Any]]:
-        """获取环境变量回退配置"""
+    def _get_env_fallback_config(self) -> Optional[Mapping[str, Any]]:
+        """获取环境变量回退配置（settings 运行期不变，只计算一次）"""
+        if self._env_fallback_cached is not _SENTINEL:
+            return self._env_fallback_cached
+        config = self._build_env_fallback_config()
+        self._env_fallback_cached = _freeze(config) if config else None
+        return self._env_fallback_cached
+
+    def _build_env_fallback_config(self) -> Optional[Dict[str, Any]]:
+        """根据 settings 构建环境变量回退配置"""
         use_openai = getattr(settings, 'USE_OPENAI_OCR', False)
 
         if use_openai and hasattr(settings, 'OPENAI_API_KEY') and settings.OPENAI_API_KEY:
@@ -562,11 +1010,8 @@ class AIServiceManager:
 
     def _test_gemini_service(self, config: Dict[str, Any]) -> Dict[str, Any]:
         """测试Gemini服务"""
-        import requests
-
         url = f"{config['api_base_url']}/v1beta/models/{config['model_name']}:generateContent"
         headers = {
-            'Content-Type': 'application/json',
             'x-goog-api-key': config['api_key']
         }
 
@@ -583,16 +1028,16 @@ class AIServiceManager:
             ]
         }
 
-        response = requests.post(
+        response = ai_http_session.post(
             url,
             headers=headers,
-            json=payload,
+            data=orjson.dumps(payload),
             timeout=config.get('timeout_seconds', 30)
         )
 
         if response.status_code == 200:
             try:
-                data = response.json()
+                data = _json_loads(response.content)
             except Exception:
                 raise Exception("Gemini API返回200但不是合法JSON")
 
@@ -624,9 +1069,7 @@ class AIServiceManager:
         - 真实调用可用
         - 但测试因解析/参数差异误判失败
         """
-        from .factory import OpenAIAIService
-
-        service = OpenAIAIService(config, self)
+        service = _get_factory().OpenAIAIService(config, self)
         resp = service.process_request({
             'type': 'text',
             'prompt': 'hi',
@@ -0,0 +1,67 @@
+"""
+AI配置异步任务
+"""
+import logging
+from celery import shared_task
+from django.db import transaction
+from .models import AIServiceConfig, AIConfigHistory
+
+logger = logging.getLogger(__name__)
+
+
+def write_config_history(entries):
+    """
+    批量写入配置变更历史
+
+    Args:
+        entries: 历史记录字典列表，键为 config_id/action/old_data/new_data/user_id/notes
+
+    Returns:
+        实际写入的记录数（已被删除的配置会被跳过）
+    """
+    config_ids = {entry['config_id'] for entry in entries}
+    existing_ids = set(
+        AIServiceConfig.objects.filter(pk__in=config_ids).values_list('pk', flat=True)
+    )
+
+    history = [
+        AIConfigHistory(
+            config_id=entry['config_id'],
+            action=entry['action'],
+            old_data=entry.get('old_data'),
+            new_data=entry.get('new_data'),
+            user_id=entry.get('user_id'),
+            notes=entry.get('notes', '')
+        )
+        for entry in entries
+        if entry['config_id'] in existing_ids
+    ]
+    AIConfigHistory.objects.bulk_create(history, batch_size=500)
+    return len(history)
+
+
+@shared_task
+def record_ai_config_history(entries):
+    """异步记录AI配置变更历史"""
+    return write_config_history(entries)
+
+
+def record_history_on_commit(*entries):
+    """
+    事务提交后投递历史记录任务，投递失败时同步写入
+
+    历史记录不再占用写请求的事务与响应时间。
+    """
+    entries = list(entries)
+
+    def _dispatch():
+        try:
+            record_ai_config_history.delay(entries)
+        except Exception as e:
+            logger.warning(f"异步记录配置历史失败，切换到同步写入: {e}")
+            try:
+                write_config_history(entries)
+            except Exception as sync_error:
+                logger.error(f"同步记录配置历史失败: {sync_error}")
+
+    transaction.on_commit(_dispatch)
@@ -0,0 +1,245 @@
+"""
+AI配置模块测试用例
+
+验证配置文件的原子写入、解析缓存，以及配置变更历史在事务提交后写入
+"""
+import json
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+
+from apps.ai_config import services
+from apps.ai_config.models import AIServiceConfig, AIConfigHistory
+from apps.ai_config.services import AIConfigFileManager
+from apps.ai_config.tasks import record_history_on_commit
+
+User = get_user_model()
+
+
+def build_config(model_name='gemini-pro'):
+    """构造一份合法的配置文件内容"""
+    return {
+        'version': '1.0',
+        'default_service': 'gemini',
+        'services': {
+            'gemini': {
+                'provider': 'gemini',
+                'api_format': 'gemini',
+                'api_base_url': 'https://example.com/v1',
+                'api_key': 'test-key',
+                'model_name': model_name,
+            }
+        }
+    }
+
+
+class AIConfigFileManagerTestCase(TestCase):
+    """AI配置文件管理器测试用例"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir, ignore_errors=True)
+        settings_override = override_settings(BASE_DIR=self.temp_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.manager = AIConfigFileManager()
+
+    def leftover_tmp_files(self):
+        """配置目录中残留的临时文件"""
+        return [name for name in os.listdir(self.manager.config_dir) if name.endswith('.tmp')]
+
+    def test_save_config_writes_atomically(self):
+        """测试保存配置写入完整 JSON 且不残留临时文件"""
+        config = build_config()
+
+        self.assertTrue(self.manager.save_config(config, backup=False))
+
+        with open(self.manager.config_file, encoding='utf-8') as f:
+            self.assertEqual(json.load(f), config)
+        self.assertEqual(self.leftover_tmp_files(), [])
+
+    def test_save_config_rejects_invalid_config(self):
+        """测试缺少必需字段的配置不会写盘"""
+        config = build_config()
+        del config['services']['gemini']['api_key']
+
+        self.assertFalse(self.manager.save_config(config, backup=False))
+        self.assertFalse(self.manager.config_file.exists())
+
+    def test_failed_replace_keeps_previous_file(self):
+        """测试替换失败时保留原配置文件并清理临时文件"""
+        self.manager.save_config(build_config(), backup=False)
+        original = self.manager.config_file.read_bytes()
+
+        with patch('apps.ai_config.services.os.replace', side_effect=OSError('disk full')):
+            self.assertFalse(self.manager.save_config(build_config('gemini-ultra'), backup=False))
+
+        self.assertEqual(self.manager.config_file.read_bytes(), original)
+        self.assertEqual(self.leftover_tmp_files(), [])
+        self.assertEqual(
+            self.manager.load_config()['services']['gemini']['model_name'],
+            'gemini-pro'
+        )
+
+    def test_load_config_uses_cache_until_file_changes(self):
+        """测试文件未变化时复用解析结果，文件被外部修改后重新加载"""
+        self.manager.save_config(build_config(), backup=False)
+
+        first = self.manager.load_config(readonly=True)
+        self.assertIs(self.manager.load_config(readonly=True), first)
+
+        # 其他进程改写配置文件（显式推进 mtime，避免文件系统时间精度不足）
+        stat = self.manager.config_file.stat()
+        self.manager.config_file.write_text(
+            json.dumps(build_config('gemini-ultra')), encoding='utf-8'
+        )
+        os.utime(self.manager.config_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+        reloaded = self.manager.load_config(readonly=True)
+        self.assertIsNot(reloaded, first)
+        self.assertEqual(reloaded['services']['gemini']['model_name'], 'gemini-ultra')
+
+    def test_load_large_config_via_mmap(self):
+        """测试超过阈值的配置文件经 mmap 解析，结果与普通读取一致"""
+        config = build_config()
+        self.manager.save_config(config, backup=False)
+
+        with patch('apps.ai_config.services.CONFIG_MMAP_THRESHOLD', 0):
+            loaded = AIConfigFileManager().load_config()
+
+        self.assertEqual(loaded, config)
+
+    def test_load_config_returns_copy_by_default(self):
+        """测试默认返回深拷贝，修改返回值不影响缓存"""
+        self.manager.save_config(build_config(), backup=False)
+
+        config = self.manager.load_config()
+        config['services']['gemini']['model_name'] = 'changed'
+
+        self.assertEqual(
+            self.manager.load_config(readonly=True)['services']['gemini']['model_name'],
+            'gemini-pro'
+        )
+
+
+LOCMEM_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'ai-config-version-tests',
+    }
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SharedCacheVersionTestCase(TestCase):
+    """共享缓存版本号本地缓存测试用例"""
+
+    def setUp(self):
+        services._local_versions.clear()
+        self.addCleanup(services._local_versions.clear)
+
+    def test_version_read_once_within_ttl(self):
+        """测试有效期内重复读取版本号不再访问共享缓存"""
+        with patch.object(services.cache, 'get_many', wraps=services.cache.get_many) as mock_get_many:
+            first = services._shared_cache_version('1')
+            second = services._shared_cache_version('1')
+
+        self.assertEqual(first, second)
+        self.assertEqual(mock_get_many.call_count, 1)
+
+    def test_version_reread_after_ttl(self):
+        """测试本地缓存过期后重新读取，能看到其他进程递增的版本号"""
+        with patch('apps.ai_config.services.time.monotonic', return_value=1000.0):
+            first = services._shared_cache_version('1')
+        # 模拟其他进程递增版本号（不经过本进程的本地缓存）
+        services.cache.incr(services._version_keys('1')[1])
+
+        with patch('apps.ai_config.services.time.monotonic', return_value=1001.0):
+            self.assertEqual(services._shared_cache_version('1'), first)
+        with patch('apps.ai_config.services.time.monotonic',
+                   return_value=1000.0 + services.SHARED_VERSION_CHECK_TTL):
+            self.assertNotEqual(services._shared_cache_version('1'), first)
+
+    def test_local_bump_visible_immediately(self):
+        """测试本进程递增版本号后立即读到新版本"""
+        first = services._shared_cache_version('1')
+        other = services._shared_cache_version('2')
+
+        services._bump_shared_cache_version('1')
+        self.assertNotEqual(services._shared_cache_version('1'), first)
+        self.assertEqual(services._shared_cache_version('2'), other)
+
+        services._bump_shared_cache_version()
+        self.assertNotEqual(services._shared_cache_version('2'), other)
+
+
+class AIConfigHistoryTestCase(TestCase):
+    """AI配置变更历史测试用例"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='configuser',
+            email='config@example.com',
+            password='testpass123'
+        )
+        self.config = AIServiceConfig.objects.create(
+            name='测试配置',
+            provider='gemini',
+            api_format='gemini',
+            api_base_url='https://example.com/v1',
+            api_key='test-key',
+            model_name='gemini-pro',
+            created_by=self.user
+        )
+
+    def history_entry(self, action='update'):
+        """构造一条历史记录"""
+        return {
+            'config_id': self.config.id,
+            'action': action,
+            'old_data': {'model_name': 'gemini-pro'},
+            'new_data': {'model_name': 'gemini-ultra'},
+            'user_id': self.user.id,
+        }
+
+    def test_history_recorded_after_commit(self):
+        """测试历史记录在事务提交后才写入"""
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            record_history_on_commit(self.history_entry(), self.history_entry('test'))
+            self.assertFalse(AIConfigHistory.objects.exists())
+
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(
+            sorted(AIConfigHistory.objects.values_list('action', flat=True)),
+            ['test', 'update']
+        )
+        history = AIConfigHistory.objects.get(action='update')
+        self.assertEqual(history.config, self.config)
+        self.assertEqual(history.user, self.user)
+        self.assertEqual(history.new_data, {'model_name': 'gemini-ultra'})
+
+    def test_history_not_recorded_without_commit(self):
+        """测试事务未提交（回滚）时不写入历史记录"""
+        with self.captureOnCommitCallbacks(execute=False):
+            record_history_on_commit(self.history_entry())
+
+        self.assertFalse(AIConfigHistory.objects.exists())
+
+    def test_history_falls_back_to_sync_write(self):
+        """测试任务投递失败时同步写入历史记录"""
+        with patch('apps.ai_config.tasks.record_ai_config_history.delay', side_effect=RuntimeError('broker down')):
+            with self.captureOnCommitCallbacks(execute=True):
+                record_history_on_commit(self.history_entry())
+
+        self.assertEqual(AIConfigHistory.objects.count(), 1)
+
+    def test_history_skips_deleted_config(self):
+        """测试提交前配置已被删除时跳过对应的历史记录"""
+        with self.captureOnCommitCallbacks(execute=True):
+            record_history_on_commit(self.history_entry())
+            self.config.delete()
+
+        self.assertFalse(AIConfigHistory.objects.exists())
@@ -5,12 +5,15 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.pagination import CursorPagination
 from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter
 from drf_spectacular.types import OpenApiTypes
 from django.utils import timezone
 from django.utils.dateparse import parse_datetime
 from django.db import transaction
+from django.core.cache import cache
 from django.shortcuts import get_object_or_404
+from django.forms.models import model_to_dict
 from .models import AIServiceConfig, AIConfigHistory, AIServiceUsageLog
 from .serializers import (
     AIServiceConfigSerializer, AIServiceConfigCreateSerializer,
@@ -21,10 +24,43 @@ from .serializers import (
 )
 from .services import AIServiceManager, ai_service_manager
 from .monitoring import get_system_health, ai_monitor
+from .tasks import record_history_on_commit
 import logging
 
 logger = logging.getLogger(__name__)
 
+# 列表接口实际渲染的模型列（success_rate 为计算属性，不对应数据库列）
+_CONFIG_LIST_FIELDS = tuple(
+    f for f in AIServiceConfigSerializer.Meta.fields if f != 'success_rate'
+)
+
+# 监控接口只读取的列；计数器每次调用都会变化，不能整行缓存
+_CONFIG_MONITOR_FIELDS = (
+    'id', 'name', 'success_count', 'failure_count', 'last_used_at', 'last_test_at',
+)
+
+# 系统健康状态的短期缓存，避免看板轮询时每次都重新统计
+SYSTEM_HEALTH_CACHE_KEY = 'ai:system_health'
+SYSTEM_HEALTH_CACHE_TIMEOUT = 10
+
+# 使用日志列表的查询参数 -> 模型字段
+_USAGE_LOG_FILTER_MAP = {
+    'config_id': 'config_id',
+    'service_type': 'service_type',
+    'user_id': 'user_id',
+}
+_USAGE_LOG_DATE_FILTERS = (
+    ('date_from', 'created_at__gte'),
+    ('date_to', 'created_at__lte'),
+)
+
+# 变更历史快照记录的可编辑配置字段（均可直接 JSON 序列化）
+_CONFIG_AUDIT_FIELDS = [
+    'name', 'description', 'provider', 'api_format', 'api_base_url',
+    'api_key', 'model_name', 'timeout_seconds', 'max_retries',
+    'extra_config', 'is_active', 'is_default', 'priority',
+]
+
 
 @extend_schema_view(
     list=extend_schema(
@@ -101,6 +137,13 @@ class AIServiceConfigViewSet(viewsets.ModelViewSet):
         if provider:
             queryset = queryset.filter(provider=provider)
         
+        if self.action == 'list':
+            # 列表只取序列化器用到的列；序列化器不跨外键，无需 select_related
+            queryset = queryset.only(*_CONFIG_LIST_FIELDS)
+        elif self.action == 'monitor':
+            # 看板轮询的监控接口不取密钥与 JSON 大字段
+            queryset = queryset.only(*_CONFIG_MONITOR_FIELDS)
+        
         return queryset.order_by('priority', '-created_at')
     
     def perform_create(self, serializer):
@@ -109,40 +152,43 @@ class AIServiceConfigViewSet(viewsets.ModelViewSet):
             config = serializer.save()
             
             # 记录创建历史
-            AIConfigHistory.objects.create(
-                config=config,
-                action='create',
-                new_data=serializer.data,
-                user=self.request.user,
-                notes=f"创建AI服务配置: {config.name}"
-            )
+            record_history_on_commit({
+                'config_id': config.pk,
+                'action': 'create',
+                'new_data': dict(serializer.data),
+                'user_id': self.request.user.pk,
+                'notes': f"创建AI服务配置: {config.name}",
+            })
             
             logger.info(f"用户 {self.request.user.username} 创建了AI配置: {config.name}")
     
     def perform_update(self, serializer):
         """更新配置时记录历史"""
         with transaction.atomic():
-            old_data = AIServiceConfigSerializer(serializer.instance).data
+            old_data = model_to_dict(serializer.instance, fields=_CONFIG_AUDIT_FIELDS)
             config = serializer.save()
             # 配置更新后需要清理 AI 服务缓存，确保“热加载”到最新 base_url/model/key 等
-            transaction.on_commit(lambda: ai_service_manager.clear_cache())
+            name = config.name
+            user = self.request.user
+            is_default = old_data['is_default'] or config.is_default
+            transaction.on_commit(lambda: ai_service_manager.invalidate(name, user, is_default))
             
             # 记录更新历史
-            AIConfigHistory.objects.create(
-                config=config,
-                action='update',
-                old_data=old_data,
-                new_data=serializer.data,
-                user=self.request.user,
-                notes=f"更新AI服务配置: {config.name}"
-            )
+            record_history_on_commit({
+                'config_id': config.pk,
+                'action': 'update',
+                'old_data': old_data,
+                'new_data': dict(serializer.data),
+                'user_id': self.request.user.pk,
+                'notes': f"更新AI服务配置: {config.name}",
+            })
             
             logger.info(f"用户 {self.request.user.username} 更新了AI配置: {config.name}")
     
     def perform_destroy(self, instance):
         """删除配置时记录历史"""
         with transaction.atomic():
-            old_data = AIServiceConfigSerializer(instance).data
+            old_data = model_to_dict(instance, fields=_CONFIG_AUDIT_FIELDS)
             
             # 记录删除历史
             AIConfigHistory.objects.create(
@@ -180,13 +226,13 @@ class AIServiceConfigViewSet(viewsets.ModelViewSet):
             config.update_test_result(test_result)
             
             # 记录测试历史
-            AIConfigHistory.objects.create(
-                config=config,
-                action='test',
-                new_data=test_result,
-                user=request.user,
-                notes=f"测试AI服务配置: {config.name}"
-            )
+            record_history_on_commit({
+                'config_id': config.pk,
+                'action': 'test',
+                'new_data': test_result,
+                'user_id': request.user.pk,
+                'notes': f"测试AI服务配置: {config.name}",
+            })
             
             logger.info(f"用户 {request.user.username} 测试了AI配置: {config.name}")
             # 成功：HTTP 200；失败：HTTP 400（前端可直接拿到错误码）
@@ -226,20 +272,21 @@ class AIServiceConfigViewSet(viewsets.ModelViewSet):
         try:
             with transaction.atomic():
                 config.is_active = True
-                config.save()
+                config.save(update_fields=['is_active', 'updated_at'])
                 name = config.name
                 user = request.user
-                transaction.on_commit(lambda: ai_service_manager.clear_cache())
-                if config.is_default:
+                is_default = config.is_default
+                transaction.on_commit(lambda: ai_service_manager.invalidate(name, user, is_default))
+                if is_default:
                     transaction.on_commit(lambda: ai_service_manager.switch_service(name, user))
                 
                 # 记录激活历史
-                AIConfigHistory.objects.create(
-                    config=config,
-                    action='activate',
-                    user=request.user,
-                    notes=f"激活AI服务配置: {config.name}"
-                )
+                record_history_on_commit({
+                    'config_id': config.pk,
+                    'action': 'activate',
+                    'user_id': request.user.pk,
+                    'notes': f"激活AI服务配置: {config.name}",
+                })
                 
                 logger.info(f"用户 {request.user.username} 激活了AI配置: {config.name}")
                 
@@ -270,16 +317,19 @@ class AIServiceConfigViewSet(viewsets.ModelViewSet):
         try:
             with transaction.atomic():
                 config.is_active = False
-                config.save()
-                transaction.on_commit(lambda: ai_service_manager.clear_cache())
+                config.save(update_fields=['is_active', 'updated_at'])
+                name = config.name
+                user = request.user
+                # 默认配置不允许停用，只需失效所有者相关缓存
+                transaction.on_commit(lambda: ai_service_manager.invalidate(name, user))
                 
                 # 记录停用历史
-                AIConfigHistory.objects.create(
-                    config=config,
-                    action='deactivate',
-                    user=request.user,
-                    notes=f"停用AI服务配置: {config.name}"
-                )
+                record_history_on_commit({
+                    'config_id': config.pk,
+                    'action': 'deactivate',
+                    'user_id': request.user.pk,
+                    'notes': f"停用AI服务配置: {config.name}",
+                })
                 
                 logger.info(f"用户 {request.user.username} 停用了AI配置: {config.name}")
                 
@@ -308,22 +358,45 @@ class AIServiceConfigViewSet(viewsets.ModelViewSet):
         
         try:
             with transaction.atomic():
-                # 取消其他默认配置
-                AIServiceConfig.objects.filter(created_by=request.user, is_default=True).update(is_default=False)
+                # 取消其他默认配置（unique_default_config 为全局唯一约束）
+                previous_defaults = list(
+                    AIServiceConfig.objects.select_for_update()
+                    .filter(is_default=True)
+                    .exclude(pk=config.pk)
+                    .only('id', 'name')
+                )
+                if previous_defaults:
+                    AIServiceConfig.objects.filter(
+                        pk__in=[c.pk for c in previous_defaults]
+                    ).update(is_default=False)
                 
-                # 设置当前配置为默认
+                # 设置当前配置为默认：只更新 is_default，不走 save() 的全字段写入与重复加锁
                 config.is_default = True
-                config.save()
+                config.updated_at = timezone.now()
+                AIServiceConfig.objects.filter(pk=config.pk).update(
+                    is_default=True, updated_at=config.updated_at
+                )
                 name = config.name
                 user = request.user
                 transaction.on_commit(lambda: ai_service_manager.switch_service(name, user))
                 
-                # 记录历史
-                AIConfigHistory.objects.create(
-                    config=config,
-                    action='update',
-                    user=request.user,
-                    notes=f"设置为默认AI服务配置: {config.name}"
+                # 记录历史：被取消默认的配置与新默认配置一次性批量写入
+                record_history_on_commit(
+                    *(
+                        {
+                            'config_id': previous.pk,
+                            'action': 'update',
+                            'user_id': request.user.pk,
+                            'notes': f"取消默认AI服务配置: {previous.name}",
+                        }
+                        for previous in previous_defaults
+                    ),
+                    {
+                        'config_id': config.pk,
+                        'action': 'update',
+                        'user_id': request.user.pk,
+                        'notes': f"设置为默认AI服务配置: {config.name}",
+                    },
                 )
                 
                 logger.info(f"用户 {request.user.username} 将AI配置设为默认: {config.name}")
@@ -459,7 +532,9 @@ class AIServiceConfigViewSet(viewsets.ModelViewSet):
     def health(self, request):
         """获取系统健康状态"""
         try:
-            health_data = get_system_health()
+            health_data = cache.get_or_set(
+                SYSTEM_HEALTH_CACHE_KEY, get_system_health, SYSTEM_HEALTH_CACHE_TIMEOUT
+            )
 
             return Response({
                 'success': True,
@@ -509,12 +584,20 @@ class AIServiceConfigViewSet(viewsets.ModelViewSet):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class CreatedAtCursorPagination(CursorPagination):
+    """按创建时间倒序的游标分页，翻页深度不影响查询耗时"""
+    ordering = '-created_at'
+    page_size = 100
+
+
 class AIConfigHistoryViewSet(viewsets.ReadOnlyModelViewSet):
     """AI配置历史视图集"""
 
-    queryset = AIConfigHistory.objects.all()
+    # 序列化器读取 config.name 与 user.username，一次 JOIN 取回避免 N+1
+    queryset = AIConfigHistory.objects.select_related('config', 'user')
     serializer_class = AIConfigHistorySerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -539,47 +622,39 @@ class AIConfigHistoryViewSet(viewsets.ReadOnlyModelViewSet):
 class AIServiceUsageLogViewSet(viewsets.ReadOnlyModelViewSet):
     """AI服务使用日志视图集"""
 
-    queryset = AIServiceUsageLog.objects.all()
+    # 序列化器读取 config.name 与 user.username，一次 JOIN 取回避免 N+1
+    queryset = AIServiceUsageLog.objects.select_related('config', 'user')
     serializer_class = AIServiceUsageLogSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
 
     def get_queryset(self):
         queryset = super().get_queryset()
+        params = self.request.query_params
 
-        # 过滤参数
-        config_id = self.request.query_params.get('config_id')
-        service_type = self.request.query_params.get('service_type')
-        is_success = self.request.query_params.get('is_success')
-        user_id = self.request.query_params.get('user_id')
-        date_from = self.request.query_params.get('date_from')
-        date_to = self.request.query_params.get('date_to')
-
-        if config_id:
-            queryset = queryset.filter(config_id=config_id)
-
-        if service_type:
-            queryset = queryset.filter(service_type=service_type)
+        # 精确匹配的过滤参数
+        filters = {
+            field: params[param]
+            for param, field in _USAGE_LOG_FILTER_MAP.items()
+            if params.get(param)
+        }
 
+        is_success = params.get('is_success')
         if is_success is not None:
-            queryset = queryset.filter(is_success=is_success.lower() == 'true')
-
-        if user_id:
-            queryset = queryset.filter(user_id=user_id)
-
-        if date_from:
-            try:
-                date_from_parsed = parse_datetime(date_from)
-                if date_from_parsed:
-                    queryset = queryset.filter(created_at__gte=date_from_parsed)
-            except ValueError:
-                pass
-
-        if date_to:
-            try:
-                date_to_parsed = parse_datetime(date_to)
-                if date_to_parsed:
-                    queryset = queryset.filter(created_at__lte=date_to_parsed)
-            except ValueError:
-                pass
+            filters['is_success'] = is_success.lower() == 'true'
+
+        # 时间范围：无法解析的日期直接忽略
+        for param, lookup in _USAGE_LOG_DATE_FILTERS:
+            value = params.get(param)
+            if value:
+                try:
+                    parsed = parse_datetime(value)
+                except ValueError:
+                    parsed = None
+                if parsed:
+                    filters[lookup] = parsed
+
+        if filters:
+            queryset = queryset.filter(**filters)
 
         return queryset.order_by('-created_at')
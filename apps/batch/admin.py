@@ -6,6 +6,40 @@ from django.utils.html import format_html
 from .models import BatchJob, BatchFileItem
 
 
+def _status_templates(status_colors):
+    """按状态预先生成带颜色的 HTML 模板，渲染时只需填入状态文字"""
+    return {
+        status: format_html('<span style="color: {};">{{}}</span>', color)
+        for status, color in status_colors.items()
+    }
+
+
+_BATCH_JOB_STATUS_HTML = _status_templates({
+    'created': 'blue',
+    'running': 'orange',
+    'completed': 'green',
+    'failed': 'red',
+    'cancelled': 'gray'
+})
+
+_BATCH_FILE_ITEM_STATUS_HTML = _status_templates({
+    'pending': 'blue',
+    'processing': 'orange',
+    'completed': 'green',
+    'failed': 'red',
+    'skipped': 'gray'
+})
+
+_DEFAULT_STATUS_HTML = format_html('<span style="color: {};">{{}}</span>', 'black')
+
+_PROGRESS_BAR_HTML = (
+    '<div style="width: 100px; background-color: #f0f0f0; border-radius: 3px;">'
+    '<div style="width: {}%; background-color: #007cba; height: 20px; border-radius: 3px; text-align: center; color: white; line-height: 20px;">'
+    '{}%'
+    '</div></div>'
+)
+
+
 class BatchFileItemInline(admin.TabularInline):
     """批量文件项内联编辑"""
     model = BatchFileItem
@@ -21,6 +55,10 @@ class BatchFileItemInline(admin.TabularInline):
     
     def has_add_permission(self, request, obj=None):
         return False
+    
+    def get_queryset(self, request):
+        """详情页内联逐行显示文件与OCR结果，一次 JOIN 取回"""
+        return super().get_queryset(request).select_related('file', 'ocr_result')
 
 
 @admin.register(BatchJob)
@@ -31,6 +69,8 @@ class BatchJobAdmin(admin.ModelAdmin):
         'processed_files', 'failed_files', 'processing_duration_display',
         'created_by', 'created_at'
     ]
+    # created_by 在列表中逐行渲染，JOIN 取回避免每行一次用户查询
+    list_select_related = ['created_by']
     list_filter = ['status', 'created_at']
     search_fields = ['name']
     readonly_fields = [
@@ -66,33 +106,15 @@ class BatchJobAdmin(admin.ModelAdmin):
     
     def status_display(self, obj):
         """显示状态"""
-        status_colors = {
-            'created': 'blue',
-            'running': 'orange',
-            'completed': 'green',
-            'failed': 'red',
-            'cancelled': 'gray'
-        }
-        color = status_colors.get(obj.status, 'black')
-        return format_html(
-            '<span style="color: {};">{}</span>',
-            color,
-            obj.get_status_display()
-        )
+        template = _BATCH_JOB_STATUS_HTML.get(obj.status, _DEFAULT_STATUS_HTML)
+        return format_html(template, obj.get_status_display())
     status_display.short_description = "状态"
     
     def progress_display(self, obj):
         """显示进度"""
         percentage = obj.progress_percentage
         if percentage > 0:
-            return format_html(
-                '<div style="width: 100px; background-color: #f0f0f0; border-radius: 3px;">'
-                '<div style="width: {}%; background-color: #007cba; height: 20px; border-radius: 3px; text-align: center; color: white; line-height: 20px;">'
-                '{}%'
-                '</div></div>',
-                percentage,
-                int(percentage)
-            )
+            return format_html(_PROGRESS_BAR_HTML, percentage, int(percentage))
         return "0%"
     progress_display.short_description = "进度"
     
@@ -117,8 +139,8 @@ class BatchJobAdmin(admin.ModelAdmin):
         """管理员可以看到所有批量任务，其他用户只能看到自己的"""
         qs = super().get_queryset(request)
         if request.user.is_superuser:
-            return qs.prefetch_related('batchfileitem_set')
-        return qs.filter(created_by=request.user).prefetch_related('batchfileitem_set')
+            return qs
+        return qs.filter(created_by=request.user)
 
 
 @admin.register(BatchFileItem)
@@ -160,19 +182,8 @@ class BatchFileItemAdmin(admin.ModelAdmin):
     
     def status_display(self, obj):
         """显示状态"""
-        status_colors = {
-            'pending': 'blue',
-            'processing': 'orange',
-            'completed': 'green',
-            'failed': 'red',
-            'skipped': 'gray'
-        }
-        color = status_colors.get(obj.status, 'black')
-        return format_html(
-            '<span style="color: {};">{}</span>',
-            color,
-            obj.get_status_display()
-        )
+        template = _BATCH_FILE_ITEM_STATUS_HTML.get(obj.status, _DEFAULT_STATUS_HTML)
+        return format_html(template, obj.get_status_display())
     status_display.short_description = "状态"
     
     def processing_time_display(self, obj):
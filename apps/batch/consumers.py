@@ -1,16 +1,87 @@
 """
 批量处理WebSocket消费者
 """
-import json
+import asyncio
 import logging
-from typing import Dict, Any
+import sys
+import threading
+import time
+from functools import wraps
+from typing import Callable, Dict, Any, List
+from asgiref.sync import async_to_sync
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
-from django.contrib.auth.models import AnonymousUser
+from channels.layers import get_channel_layer
+import msgpack
+import orjson
 from .models import BatchJob
 
 logger = logging.getLogger(__name__)
 
+# 积压时可以只保留最新一条的消息类型（旧进度已无意义）
+_COALESCIBLE_EVENT_TYPES = frozenset({'batch_progress_update'})
+
+# 同步发送的群组消息合并刷新间隔（秒）
+BATCH_UPDATE_FLUSH_INTERVAL = 0.25
+
+# 客户端请求该子协议时以 MessagePack 二进制帧收发消息
+MSGPACK_SUBPROTOCOL = 'msgpack'
+
+# 群组消息的固定 JSON 前缀，只有 data 与 timestamp 需要逐帧序列化
+_GROUP_EVENT_TYPES = ('batch_progress_update', 'file_processing_update', 'batch_job_completed')
+_FRAME_PREFIXES = {
+    message_type: '{"type":%s,"data":' % orjson.dumps(message_type).decode()
+    for message_type in _GROUP_EVENT_TYPES
+}
+_FRAME_SUFFIX = ',"timestamp":%d}'
+
+
+def _now_ms() -> int:
+    """当前 Unix 时间戳（毫秒）"""
+    return time.time_ns() // 1_000_000
+
+
+def _dumps(payload: Dict[str, Any]) -> str:
+    """序列化 WebSocket 消息为文本帧内容"""
+    return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS).decode()
+
+
+def _loads(text: str) -> Any:
+    """解析客户端发送的 JSON 文本"""
+    return orjson.loads(text)
+
+
+def _dumps_frame(message_type: str, data: Dict[str, Any], timestamp: int) -> str:
+    """按固定前缀拼接群组消息帧，等价于 _dumps({'type', 'data', 'timestamp'})"""
+    prefix = _FRAME_PREFIXES.get(message_type)
+    if prefix is None:
+        return _dumps({'type': message_type, 'data': data, 'timestamp': timestamp})
+    return prefix + _dumps(data) + _FRAME_SUFFIX % timestamp
+
+
+def _packb(payload: Dict[str, Any]) -> bytes:
+    """序列化 WebSocket 消息为 MessagePack 二进制帧内容"""
+    return msgpack.packb(payload, use_bin_type=True)
+
+
+def _unpackb(data: bytes) -> Any:
+    """解析客户端发送的 MessagePack 数据"""
+    return msgpack.unpackb(data, raw=False)
+
+
+def ws_handler(log_message: str, error_message: str):
+    """WebSocket 消息处理装饰器：统一捕获异常、记录日志并向客户端回传错误"""
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            try:
+                return await func(self, *args, **kwargs)
+            except Exception as e:
+                logger.error(f"{log_message}: {e}")
+                await self.send_error(f"{error_message}: {str(e)}")
+        return wrapper
+    return decorator
+
 
 class BatchProcessingConsumer(AsyncWebsocketConsumer):
     """
@@ -23,25 +94,38 @@ class BatchProcessingConsumer(AsyncWebsocketConsumer):
         self.batch_job_id = None
         self.batch_group_name = None
         self.user = None
+        # 日志中使用的用户名，连接时确定
+        self._username = 'Unknown'
+        # 是否使用 MessagePack 子协议（握手时协商）
+        self.use_msgpack = False
+        # 群组消息先入队，由后台写协程批量取出后发送
+        self._outbox = None
+        self._writer_task = None
 
     async def connect(self):
         """连接WebSocket"""
         try:
             # 获取用户信息
-            self.user = self.scope["user"]
+            self.user = self.scope.get("user")
             
             # 检查用户是否已认证
-            if isinstance(self.user, AnonymousUser):
+            if not self.user or not self.user.is_authenticated:
                 logger.warning("未认证用户尝试连接WebSocket")
                 await self.close(code=4001)
                 return
             
-            # 接受WebSocket连接
-            await self.accept()
-            logger.info(f"用户 {self.user.username} 已连接到批量处理WebSocket")
+            self._username = self.user.username
+            
+            # 接受WebSocket连接，客户端请求时协商 MessagePack 子协议
+            self.use_msgpack = MSGPACK_SUBPROTOCOL in self.scope.get('subprotocols', [])
+            await self.accept(subprotocol=MSGPACK_SUBPROTOCOL if self.use_msgpack else None)
+            logger.info(f"用户 {self._username} 已连接到批量处理WebSocket")
+            
+            self._outbox = asyncio.Queue()
+            self._writer_task = asyncio.ensure_future(self._drain_outbox())
             
             # 发送连接成功消息
-            await self.send(text_data=json.dumps({
+            await self._send_json({
                 'type': 'connection_established',
                 'data': {
                     'user_id': self.user.id,
@@ -49,7 +133,7 @@ class BatchProcessingConsumer(AsyncWebsocketConsumer):
                     'message': 'WebSocket连接已建立'
                 },
                 'timestamp': self._get_timestamp()
-            }))
+            })
             
         except Exception as e:
             logger.error(f"WebSocket连接失败: {e}")
@@ -57,6 +141,10 @@ class BatchProcessingConsumer(AsyncWebsocketConsumer):
 
     async def disconnect(self, close_code):
         """断开WebSocket连接"""
+        if self._writer_task:
+            self._writer_task.cancel()
+            self._writer_task = None
+        
         try:
             # 离开批量任务组
             if self.batch_group_name:
@@ -64,240 +152,413 @@ class BatchProcessingConsumer(AsyncWebsocketConsumer):
                     self.batch_group_name,
                     self.channel_name
                 )
-                logger.info(f"用户 {self.user.username if self.user else 'Unknown'} 已离开批量任务组: {self.batch_group_name}")
+                logger.info(f"用户 {self._username} 已离开批量任务组: {self.batch_group_name}")
             
-            logger.info(f"用户 {self.user.username if self.user else 'Unknown'} 已断开WebSocket连接 (code: {close_code})")
+            logger.info(f"用户 {self._username} 已断开WebSocket连接 (code: {close_code})")
             
         except Exception as e:
             logger.error(f"断开WebSocket连接时出错: {e}")
 
-    async def receive(self, text_data):
+    @ws_handler('处理WebSocket消息时出错', '处理消息时出错')
+    async def receive(self, text_data=None, bytes_data=None):
         """接收客户端消息"""
         try:
-            data = json.loads(text_data)
-            message_type = data.get('type')
-            message_data = data.get('data', {})
-            
-            logger.info(f"收到WebSocket消息: {message_type} from {self.user.username}")
-            
-            # 处理不同类型的消息
-            if message_type == 'subscribe_batch_job':
-                await self.handle_subscribe_batch_job(message_data)
-            elif message_type == 'unsubscribe_batch_job':
-                await self.handle_unsubscribe_batch_job(message_data)
-            elif message_type == 'ping':
-                await self.handle_ping()
+            if text_data is not None:
+                data = _loads(text_data)
+            elif self.use_msgpack:
+                data = _unpackb(bytes_data)
             else:
-                logger.warning(f"未知消息类型: {message_type}")
-                await self.send_error(f"未知消息类型: {message_type}")
-                
-        except json.JSONDecodeError:
+                await self.send_error("未协商 MessagePack 子协议，不支持二进制消息")
+                return
+        except orjson.JSONDecodeError:
             logger.error("无效的JSON数据")
             await self.send_error("无效的JSON数据")
-        except Exception as e:
-            logger.error(f"处理WebSocket消息时出错: {e}")
-            await self.send_error(f"处理消息时出错: {str(e)}")
+            return
+        except ValueError:
+            logger.error("无效的MessagePack数据")
+            await self.send_error("无效的MessagePack数据")
+            return
+        
+        message_type = data.get('type')
+        message_data = data.get('data', {})
+        
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(f"收到WebSocket消息: {message_type} from {self._username}")
+        
+        # 处理不同类型的消息
+        if message_type == 'subscribe_batch_job':
+            await self.handle_subscribe_batch_job(message_data)
+        elif message_type == 'unsubscribe_batch_job':
+            await self.handle_unsubscribe_batch_job(message_data)
+        elif message_type == 'ping':
+            await self.handle_ping()
+        else:
+            logger.warning(f"未知消息类型: {message_type}")
+            await self.send_error(f"未知消息类型: {message_type}")
 
+    @ws_handler('订阅批量任务时出错', '订阅批量任务失败')
     async def handle_subscribe_batch_job(self, data: Dict[str, Any]):
         """处理订阅批量任务"""
-        try:
-            batch_job_id = data.get('batch_job_id')
-            if not batch_job_id:
-                await self.send_error("batch_job_id is required")
-                return
-            
-            # 检查批量任务是否存在且用户有权限访问
-            batch_job = await self.get_batch_job(batch_job_id)
-            if not batch_job:
-                await self.send_error(f"批量任务 {batch_job_id} 不存在或无权限访问")
-                return
-            
-            # 如果之前订阅了其他任务，先取消订阅
-            if self.batch_group_name:
-                await self.channel_layer.group_discard(
-                    self.batch_group_name,
-                    self.channel_name
-                )
-            
-            # 订阅新的批量任务
-            self.batch_job_id = batch_job_id
-            self.batch_group_name = f"batch_job_{batch_job_id}"
-            
-            await self.channel_layer.group_add(
+        batch_job_id = data.get('batch_job_id')
+        if not batch_job_id:
+            await self.send_error("batch_job_id is required")
+            return
+        
+        # 检查批量任务是否存在且用户有权限访问
+        batch_job = await self.get_batch_job(batch_job_id)
+        if not batch_job:
+            await self.send_error(f"批量任务 {batch_job_id} 不存在或无权限访问")
+            return
+        
+        # 如果之前订阅了其他任务，先取消订阅
+        if self.batch_group_name:
+            await self.channel_layer.group_discard(
                 self.batch_group_name,
                 self.channel_name
             )
-            
-            logger.info(f"用户 {self.user.username} 已订阅批量任务: {batch_job_id}")
-            
-            # 发送订阅成功消息
-            await self.send(text_data=json.dumps({
-                'type': 'subscription_success',
-                'data': {
-                    'batch_job_id': batch_job_id,
-                    'batch_job_name': batch_job.name,
-                    'message': f'已订阅批量任务: {batch_job.name}'
-                },
-                'timestamp': self._get_timestamp()
-            }))
-            
-            # 发送当前任务状态
-            await self.send_batch_status(batch_job)
-            
-        except Exception as e:
-            logger.error(f"订阅批量任务时出错: {e}")
-            await self.send_error(f"订阅批量任务失败: {str(e)}")
+        
+        # 订阅新的批量任务
+        self.batch_job_id = batch_job_id
+        self.batch_group_name = f"batch_job_{batch_job_id}"
+        
+        await self.channel_layer.group_add(
+            self.batch_group_name,
+            self.channel_name
+        )
+        
+        logger.info(f"用户 {self._username} 已订阅批量任务: {batch_job_id}")
+        
+        # 发送订阅成功消息
+        await self._send_json({
+            'type': 'subscription_success',
+            'data': {
+                'batch_job_id': batch_job_id,
+                'batch_job_name': batch_job['name'],
+                'message': f'已订阅批量任务: {batch_job["name"]}'
+            },
+            'timestamp': self._get_timestamp()
+        })
+        
+        # 发送当前任务状态
+        await self.send_batch_status(batch_job)
 
+    @ws_handler('取消订阅批量任务时出错', '取消订阅失败')
     async def handle_unsubscribe_batch_job(self, data: Dict[str, Any]):
         """处理取消订阅批量任务"""
-        try:
-            if self.batch_group_name:
-                await self.channel_layer.group_discard(
-                    self.batch_group_name,
-                    self.channel_name
-                )
-                
-                logger.info(f"用户 {self.user.username} 已取消订阅批量任务: {self.batch_job_id}")
-                
-                # 发送取消订阅成功消息
-                await self.send(text_data=json.dumps({
-                    'type': 'unsubscription_success',
-                    'data': {
-                        'batch_job_id': self.batch_job_id,
-                        'message': '已取消订阅批量任务'
-                    },
-                    'timestamp': self._get_timestamp()
-                }))
-                
-                self.batch_job_id = None
-                self.batch_group_name = None
-            
-        except Exception as e:
-            logger.error(f"取消订阅批量任务时出错: {e}")
-            await self.send_error(f"取消订阅失败: {str(e)}")
+        if not self.batch_group_name:
+            return
+        
+        await self.channel_layer.group_discard(
+            self.batch_group_name,
+            self.channel_name
+        )
+        
+        logger.info(f"用户 {self._username} 已取消订阅批量任务: {self.batch_job_id}")
+        
+        # 发送取消订阅成功消息
+        await self._send_json({
+            'type': 'unsubscription_success',
+            'data': {
+                'batch_job_id': self.batch_job_id,
+                'message': '已取消订阅批量任务'
+            },
+            'timestamp': self._get_timestamp()
+        })
+        
+        self.batch_job_id = None
+        self.batch_group_name = None
 
     async def handle_ping(self):
         """处理心跳检测"""
-        await self.send(text_data=json.dumps({
+        await self._send_json({
             'type': 'pong',
             'data': {'message': 'pong'},
             'timestamp': self._get_timestamp()
-        }))
+        })
 
     async def send_error(self, message: str):
         """发送错误消息"""
-        await self.send(text_data=json.dumps({
+        await self._send_json({
             'type': 'error',
             'data': {'message': message},
             'timestamp': self._get_timestamp()
-        }))
+        })
 
-    async def send_batch_status(self, batch_job):
-        """发送批量任务状态"""
-        await self.send(text_data=json.dumps({
+    async def send_batch_status(self, batch_job: Dict[str, Any]):
+        """发送批量任务状态（batch_job 为 get_batch_job 返回的字段快照）"""
+        total_files = batch_job['total_files']
+        processed_files = batch_job['processed_files']
+        await self._send_json({
             'type': 'batch_progress_update',
             'data': {
-                'batch_job_id': batch_job.id,
-                'progress_percentage': batch_job.progress_percentage,
-                'processed_files': batch_job.processed_files,
-                'failed_files': batch_job.failed_files,
-                'status': batch_job.status,
-                'total_files': batch_job.total_files
+                'batch_job_id': batch_job['id'],
+                'progress_percentage': (processed_files / total_files) * 100 if total_files else 0,
+                'processed_files': processed_files,
+                'failed_files': batch_job['failed_files'],
+                'status': batch_job['status'],
+                'total_files': total_files
             },
             'timestamp': self._get_timestamp()
-        }))
+        })
 
     # 群组消息处理方法
     async def batch_progress_update(self, event):
         """处理批量任务进度更新"""
-        await self.send(text_data=json.dumps({
-            'type': 'batch_progress_update',
-            'data': event['data'],
-            'timestamp': self._get_timestamp()
-        }))
+        await self._forward_group_event(event)
 
     async def file_processing_update(self, event):
         """处理文件处理状态更新"""
-        await self.send(text_data=json.dumps({
-            'type': 'file_processing_update', 
-            'data': event['data'],
-            'timestamp': self._get_timestamp()
-        }))
+        await self._forward_group_event(event)
 
     async def batch_job_completed(self, event):
         """处理批量任务完成"""
-        await self.send(text_data=json.dumps({
-            'type': 'batch_job_completed',
-            'data': event['data'],
-            'timestamp': self._get_timestamp()
-        }))
+        await self._forward_group_event(event)
+
+    async def batch_updates_bulk(self, event):
+        """处理合并发送的群组消息：逐条按原消息类型转发，客户端协议不变"""
+        for item in event['events']:
+            await self._forward_group_event(item)
+
+    async def _forward_group_event(self, event: Dict[str, Any]):
+        """
+        转发群组消息：JSON 订阅者直接使用发送方已序列化好的帧，所有订阅者共用；
+        MessagePack 订阅者按 data 自行编码（群组消息只携带一种序列化结果）
+        """
+        if self.use_msgpack:
+            frame = _packb({
+                'type': event['type'],
+                'data': event['data'],
+                'timestamp': event.get('timestamp') or self._get_timestamp()
+            })
+        else:
+            frame = event.get('cached')
+            if frame is None:
+                frame = _dumps_frame(event['type'], event['data'], self._get_timestamp())
+        
+        if self._outbox is None:
+            await self._send_frame(frame)
+            return
+        
+        data = event.get('data') or {}
+        self._outbox.put_nowait(((event['type'], data.get('batch_job_id')), frame))
+
+    async def _drain_outbox(self):
+        """
+        后台写协程：一次取出所有积压消息再发送
+        同一批量任务的进度更新只保留最新一条，其余消息按原顺序发送
+        """
+        queue = self._outbox
+        while True:
+            pending = [await queue.get()]
+            while not queue.empty():
+                pending.append(queue.get_nowait())
+            
+            latest = {}
+            for index, (key, _) in enumerate(pending):
+                if key[0] in _COALESCIBLE_EVENT_TYPES:
+                    latest[key] = index
+            
+            for index, (key, frame) in enumerate(pending):
+                if key[0] in _COALESCIBLE_EVENT_TYPES and latest[key] != index:
+                    continue
+                try:
+                    await self._send_frame(frame)
+                except Exception as e:
+                    logger.error(f"发送WebSocket群组消息失败: {e}")
+
+    def _encode(self, payload: Dict[str, Any]):
+        """按协商的子协议序列化消息：MessagePack 为 bytes，JSON 为 str"""
+        if self.use_msgpack:
+            return _packb(payload)
+        return _dumps(payload)
+
+    async def _send_frame(self, frame):
+        """发送已序列化的帧，bytes 走二进制帧，str 走文本帧"""
+        if isinstance(frame, bytes):
+            await self.send(bytes_data=frame)
+        else:
+            await self.send(text_data=frame)
+
+    async def _send_json(self, payload: Dict[str, Any]):
+        """按协商的子协议发送消息（所有下行消息共用）"""
+        await self._send_frame(self._encode(payload))
 
     # 数据库操作方法
     @database_sync_to_async
     def get_batch_job(self, batch_job_id: int):
-        """获取批量任务"""
+        """获取批量任务的状态快照（只取推送所需字段，不构造模型实例）"""
         try:
             return BatchJob.objects.filter(
                 id=batch_job_id,
-                created_by=self.user
+                created_by_id=self.user.id
+            ).values(
+                'id', 'name', 'status', 'total_files', 'processed_files', 'failed_files'
             ).first()
         except Exception as e:
             logger.error(f"获取批量任务失败: {e}")
             return None
 
     def _get_timestamp(self) -> int:
-        """获取当前时间戳"""
-        from django.utils import timezone
-        return int(timezone.now().timestamp() * 1000)
+        """获取当前时间戳（毫秒）"""
+        return _now_ms()
 
 
 # 用于在任务中发送WebSocket消息的工具函数
-def send_batch_progress_update(batch_job_id: int, progress_data: Dict[str, Any]):
-    """发送批量任务进度更新"""
-    from channels.layers import get_channel_layer
-    from asgiref.sync import async_to_sync
-    
-    channel_layer = get_channel_layer()
+def _build_group_event(message_type: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    构造群组消息，JSON 帧只序列化一次，由各订阅者直接转发
+
+    只附带 JSON 帧：同时附带 MessagePack 帧会使通道层负载翻倍，
+    而每个订阅者只会用到其中一种。
+    """
+    timestamp = _now_ms()
+    return {
+        'type': message_type,
+        'data': data,
+        'timestamp': timestamp,
+        'cached': _dumps_frame(message_type, data, timestamp)
+    }
+
+
+_channel_layer = None
+
+
+def _layer():
+    """获取通道层，首次调用后缓存在模块级变量中"""
+    global _channel_layer
+    if _channel_layer is None:
+        _channel_layer = get_channel_layer()
+    return _channel_layer
+
+
+def _group_name(batch_job_id: int) -> str:
+    """批量任务组名（驻留字符串，同一任务反复推送时复用同一对象）"""
+    return sys.intern(f"batch_job_{batch_job_id}")
+
+
+async def _agroup_send(batch_job_id: int, event: Dict[str, Any]):
+    """向批量任务组广播一条群组消息（异步）"""
+    channel_layer = _layer()
     if channel_layer:
-        group_name = f"batch_job_{batch_job_id}"
-        async_to_sync(channel_layer.group_send)(
-            group_name,
-            {
-                'type': 'batch_progress_update',
-                'data': progress_data
-            }
+        await channel_layer.group_send(_group_name(batch_job_id), event)
+
+
+async def _agroup_send_frame(batch_job_id: int, message_type: str, data: Dict[str, Any]):
+    """向批量任务组广播消息（异步）"""
+    await _agroup_send(batch_job_id, _build_group_event(message_type, data))
+
+
+# 调度到事件循环的群组发送任务：保留引用，避免任务在完成前被垃圾回收
+_background_sends = set()
+
+
+def _on_background_send_done(task: asyncio.Task):
+    """后台发送完成回调：释放引用并记录发送异常"""
+    _background_sends.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"发送WebSocket群组消息失败: {task.exception()}")
+
+
+def _group_send(batch_job_id: int, event: Dict[str, Any]):
+    """向批量任务组广播一条群组消息（同步，供 Celery 任务等同步代码调用）"""
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        async_to_sync(_agroup_send)(batch_job_id, event)
+    else:
+        # 已处于事件循环线程中，async_to_sync 会报错，改为调度到当前循环
+        task = loop.create_task(_agroup_send(batch_job_id, event))
+        _background_sends.add(task)
+        task.add_done_callback(_on_background_send_done)
+
+
+# 同步发送的群组消息先缓冲，按批量任务每个周期合并为一次 group_send
+_pending_updates: Dict[int, List[Dict[str, Any]]] = {}
+_pending_lock = threading.Lock()
+_flush_timer = None
+# 串行化刷新：定时器线程与完成通知的立即刷新不能交错发送
+_flush_lock = threading.Lock()
+
+
+def _queue_group_event(batch_job_id: int, message_type: str, data: Dict[str, Any]):
+    """缓冲一条群组消息，首条消息入队时启动定时刷新"""
+    global _flush_timer
+    with _pending_lock:
+        _pending_updates.setdefault(batch_job_id, []).append(
+            _build_group_event(message_type, data)
         )
+        if _flush_timer is None:
+            _flush_timer = threading.Timer(BATCH_UPDATE_FLUSH_INTERVAL, flush_batch_updates)
+            _flush_timer.daemon = True
+            _flush_timer.start()
 
 
-def send_file_processing_update(batch_job_id: int, file_data: Dict[str, Any]):
-    """发送文件处理状态更新"""
-    from channels.layers import get_channel_layer
-    from asgiref.sync import async_to_sync
+def _coalesce_events(events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """同一周期内的进度更新只保留最新一条（放在其原位置），其余消息保持顺序"""
+    latest = {}
+    for index, event in enumerate(events):
+        if event['type'] in _COALESCIBLE_EVENT_TYPES:
+            latest[event['type']] = index
+    return [
+        event for index, event in enumerate(events)
+        if event['type'] not in _COALESCIBLE_EVENT_TYPES or latest[event['type']] == index
+    ]
+
+
+def flush_batch_updates():
+    """
+    立即发送所有缓冲的群组消息，每个批量任务一次 group_send
     
-    channel_layer = get_channel_layer()
-    if channel_layer:
-        group_name = f"batch_job_{batch_job_id}"
-        async_to_sync(channel_layer.group_send)(
-            group_name,
-            {
-                'type': 'file_processing_update',
-                'data': file_data
+    取出与发送都在 _flush_lock 内完成：先取出的消息一定先发出，
+    定时器线程正在发送的旧进度不会晚于完成消息到达客户端。
+    """
+    global _flush_timer
+    with _flush_lock:
+        with _pending_lock:
+            pending = dict(_pending_updates)
+            _pending_updates.clear()
+            if _flush_timer is not None:
+                _flush_timer.cancel()
+                _flush_timer = None
+        
+        for batch_job_id, events in pending.items():
+            events = _coalesce_events(events)
+            event = events[0] if len(events) == 1 else {
+                'type': 'batch_updates_bulk',
+                'events': events
             }
-        )
+            try:
+                _group_send(batch_job_id, event)
+            except Exception as e:
+                logger.error(f"发送批量WebSocket消息失败: {e}")
+
+
+def send_batch_progress_update(batch_job_id: int, progress_data: Dict[str, Any]):
+    """发送批量任务进度更新（合并到下一个刷新周期）"""
+    _queue_group_event(batch_job_id, 'batch_progress_update', progress_data)
+
+
+def send_file_processing_update(batch_job_id: int, file_data: Dict[str, Any]):
+    """发送文件处理状态更新（合并到下一个刷新周期）"""
+    _queue_group_event(batch_job_id, 'file_processing_update', file_data)
 
 
 def send_batch_job_completed(batch_job_id: int, completion_data: Dict[str, Any]):
-    """发送批量任务完成消息"""
-    from channels.layers import get_channel_layer
-    from asgiref.sync import async_to_sync
-    
-    channel_layer = get_channel_layer()
-    if channel_layer:
-        group_name = f"batch_job_{batch_job_id}"
-        async_to_sync(channel_layer.group_send)(
-            group_name,
-            {
-                'type': 'batch_job_completed',
-                'data': completion_data
-            }
-        )
\ No newline at end of file
+    """发送批量任务完成消息（连同缓冲中的消息立即发送）"""
+    _queue_group_event(batch_job_id, 'batch_job_completed', completion_data)
+    flush_batch_updates()
+
+
+async def asend_batch_progress_update(batch_job_id: int, progress_data: Dict[str, Any]):
+    """发送批量任务进度更新（异步调用方直接 await）"""
+    await _agroup_send_frame(batch_job_id, 'batch_progress_update', progress_data)
+
+
+async def asend_file_processing_update(batch_job_id: int, file_data: Dict[str, Any]):
+    """发送文件处理状态更新（异步调用方直接 await）"""
+    await _agroup_send_frame(batch_job_id, 'file_processing_update', file_data)
+
+
+async def asend_batch_job_completed(batch_job_id: int, completion_data: Dict[str, Any]):
+    """发送批量任务完成消息（异步调用方直接 await）"""
+    await _agroup_send_frame(batch_job_id, 'batch_job_completed', completion_data)
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.23 on 2026-10-16 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("batch", "0002_alter_batchjob_status"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="batchfileitem",
+            index=models.Index(
+                fields=["batch_job", "status"], name="bfi_job_status_idx"
+            ),
+        ),
+    ]
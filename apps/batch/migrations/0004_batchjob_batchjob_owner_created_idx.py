@@ -0,0 +1,19 @@
+# Generated by Django 4.2.23 on 2026-10-16 12:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("batch", "0003_batchfileitem_bfi_job_status_idx"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="batchjob",
+            index=models.Index(
+                fields=["created_by", "-created_at"], name="batchjob_owner_created_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.23 on 2026-10-16 13:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("batch", "0004_batchjob_batchjob_owner_created_idx"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="batchfileitem",
+            index=models.Index(
+                condition=models.Q(("status", "pending")),
+                fields=["batch_job", "processing_order"],
+                name="bfi_job_pending_idx",
+            ),
+        ),
+    ]
@@ -38,6 +38,10 @@ class BatchJob(BaseModel):
         ordering = ['-created_at']
         verbose_name = '批量任务'
         verbose_name_plural = '批量任务'
+        indexes = [
+            # 任务列表按创建者隔离并按时间倒序
+            models.Index(fields=['created_by', '-created_at'], name='batchjob_owner_created_idx'),
+        ]
         
     def __str__(self):
         return f"{self.name} ({self.get_status_display()})"
@@ -86,6 +90,16 @@ class BatchFileItem(BaseModel):
         ordering = ['processing_order']
         verbose_name = '批量文件项'
         verbose_name_plural = '批量文件项'
+        indexes = [
+            # 按任务统计各状态文件数
+            models.Index(fields=['batch_job', 'status'], name='bfi_job_status_idx'),
+            # 启动批量处理时按任务取待处理项，走只含 pending 行的部分索引
+            models.Index(
+                fields=['batch_job', 'processing_order'],
+                condition=models.Q(status='pending'),
+                name='bfi_job_pending_idx'
+            ),
+        ]
         
     def __str__(self):
         return f"{self.batch_job.name} - {self.file.original_name}"
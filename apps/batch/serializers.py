@@ -105,18 +105,17 @@ class BatchJobCreateSerializer(serializers.Serializer):
         
         # 检查文件是否存在且为图片
         user = self.context['request'].user
-        files = UploadedFile.objects.filter(
+        files = list(UploadedFile.objects.filter(
             id__in=value,
             created_by=user
-        )
+        ).values_list('file_type', 'original_name'))
         
-        if files.count() != len(value):
+        if len(files) != len(value):
             raise serializers.ValidationError("部分文件不存在或无权限访问")
         
         # 检查是否都是图片文件
-        non_image_files = files.filter(file_type__ne='image')
-        if non_image_files.exists():
-            non_image_names = list(non_image_files.values_list('original_name', flat=True))
+        non_image_names = [name for file_type, name in files if file_type != 'image']
+        if non_image_names:
             raise serializers.ValidationError(
                 f"以下文件不是图片格式: {', '.join(non_image_names)}"
             )
@@ -2,24 +2,37 @@
 批量处理服务 - 移植自GUI项目的batch_image_process_dialog.py
 """
 import os
+import shutil
+import threading
 import time
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Dict, Any, List, Optional
 from django.conf import settings
+from django.core.cache import cache
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
 from django.utils import timezone
-from django.db import transaction
+from django.db import connections, transaction
+from django.db.models import Avg, Count, Max, Min, Q
+from PIL import Image
 from .models import BatchJob, BatchFileItem
 from apps.files.models import UploadedFile
 
 logger = logging.getLogger(__name__)
 
+# 非 sendfile 路径下的文件复制块大小
+FILE_COPY_CHUNK_SIZE = 1024 * 1024
+
+# 批量处理中单个文件OCR的最长等待时间（秒）
+BATCH_FILE_OCR_TIMEOUT = getattr(settings, 'BATCH_FILE_OCR_TIMEOUT', 300)
+
 
 class BatchProcessingService:
     """批量处理服务 - 移植自GUI项目功能"""
     
     def __init__(self):
-        self.processing_delay = 1  # 处理间隔（秒）
         self.max_concurrent_tasks = getattr(settings, 'BATCH_MAX_CONCURRENT_TASKS', 5)
     
     def create_batch_job(self, name: str, file_paths: List[str], settings: Dict[str, Any], user_id: int) -> BatchJob:
@@ -46,18 +59,16 @@ class BatchProcessingService:
                 )
                 
                 # 创建文件项
-                file_items = []
-                for i, file_path in enumerate(file_paths):
-                    # 查找或创建上传文件记录
-                    uploaded_file = self._get_or_create_uploaded_file(file_path, user_id)
-                    
-                    file_item = BatchFileItem(
+                uploaded_files = self._get_or_create_uploaded_files(file_paths, user_id)
+                file_items = [
+                    BatchFileItem(
                         batch_job=batch_job,
                         file=uploaded_file,
                         processing_order=i,
                         created_by_id=user_id
                     )
-                    file_items.append(file_item)
+                    for i, uploaded_file in enumerate(uploaded_files)
+                ]
                 
                 BatchFileItem.objects.bulk_create(file_items)
                 
@@ -68,38 +79,44 @@ class BatchProcessingService:
             logger.error(f"创建批量任务失败: {e}")
             raise e
     
-    def _get_or_create_uploaded_file(self, file_path: str, user_id: int) -> UploadedFile:
-        """获取或创建上传文件记录"""
-        file_path_obj = Path(file_path)
+    def _get_or_create_uploaded_files(self, file_paths: List[str], user_id: int) -> List[UploadedFile]:
+        """批量获取或创建上传文件记录，返回顺序与 file_paths 一致"""
+        path_objs = [Path(file_path) for file_path in file_paths]
+        names = {path_obj.name for path_obj in path_objs}
         
-        # 尝试查找现有文件
-        existing_file = UploadedFile.objects.filter(
-            original_name=file_path_obj.name,
+        # 一次查询取出已存在的文件，同名时沿用最新的一条
+        existing = {}
+        for uploaded_file in UploadedFile.objects.filter(
+            original_name__in=names,
             created_by_id=user_id
-        ).first()
+        ).order_by('-created_at'):
+            existing.setdefault(uploaded_file.original_name, uploaded_file)
         
-        if existing_file:
-            return existing_file
+        # 批量创建缺失的文件记录，同一批次内的重名文件只创建一次
+        missing = {}
+        for file_path, path_obj in zip(file_paths, path_objs):
+            if path_obj.name in existing or path_obj.name in missing:
+                continue
+            missing[path_obj.name] = (file_path, UploadedFile(
+                original_name=path_obj.name,
+                file_size=path_obj.stat().st_size if path_obj.exists() else 0,
+                file_type='image',
+                created_by_id=user_id
+            ))
         
-        # 创建新的文件记录
-        uploaded_file = UploadedFile.objects.create(
-            original_name=file_path_obj.name,
-            file_size=file_path_obj.stat().st_size if file_path_obj.exists() else 0,
-            file_type='image',
-            created_by_id=user_id
-        )
-        
-        # 复制文件到媒体目录
-        self._copy_file_to_media(file_path, uploaded_file)
+        if missing:
+            UploadedFile.objects.bulk_create([uploaded_file for _, uploaded_file in missing.values()])
+            
+            # 记录入库后再复制文件到媒体目录（目标路径依赖主键）
+            for file_path, uploaded_file in missing.values():
+                self._copy_file_to_media(file_path, uploaded_file)
+                existing[uploaded_file.original_name] = uploaded_file
         
-        return uploaded_file
+        return [existing[path_obj.name] for path_obj in path_objs]
     
     def _copy_file_to_media(self, source_path: str, uploaded_file: UploadedFile):
         """复制文件到媒体目录"""
         try:
-            import shutil
-            from django.core.files.storage import default_storage
-            
             source_path_obj = Path(source_path)
             if not source_path_obj.exists():
                 logger.warning(f"源文件不存在: {source_path}")
@@ -108,15 +125,45 @@ class BatchProcessingService:
             # 生成目标路径
             target_path = f"uploads/{timezone.now().strftime('%Y/%m')}/{uploaded_file.id}_{source_path_obj.name}"
             
-            # 复制文件
-            with open(source_path, 'rb') as source_file:
-                uploaded_file.file.save(target_path, source_file, save=True)
+            storage = uploaded_file.file.storage
+            if isinstance(storage, FileSystemStorage):
+                # 本地存储直接在内核中拷贝，不经过 Python 缓冲区
+                field = uploaded_file.file.field
+                name = storage.get_available_name(
+                    field.generate_filename(uploaded_file, target_path),
+                    max_length=field.max_length
+                )
+                self._stream_copy(source_path, storage.path(name))
+                uploaded_file.file.name = name
+                uploaded_file.save()
+            else:
+                # 其他存储后端按块读取上传
+                with open(source_path, 'rb') as source_file:
+                    uploaded_file.file.save(target_path, File(source_file, name=source_path_obj.name), save=True)
             
-            logger.info(f"文件复制成功: {source_path} -> {target_path}")
+            logger.info(f"文件复制成功: {source_path} -> {uploaded_file.file.name}")
             
         except Exception as e:
             logger.error(f"文件复制失败: {e}")
     
+    def _stream_copy(self, source_path: str, target_path: str):
+        """流式复制文件，优先使用 sendfile 零拷贝，内存占用与文件大小无关"""
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        with open(source_path, 'rb') as src, open(target_path, 'xb') as dst:
+            size = os.fstat(src.fileno()).st_size
+            offset = 0
+            try:
+                while offset < size:
+                    sent = os.sendfile(dst.fileno(), src.fileno(), offset, size - offset)
+                    if sent == 0:
+                        break
+                    offset += sent
+            except (AttributeError, OSError):
+                # 平台不支持 sendfile 时回退到分块复制
+                src.seek(offset)
+                dst.seek(offset)
+                shutil.copyfileobj(src, dst, length=FILE_COPY_CHUNK_SIZE)
+    
     # 代理相关方法已移除
     
     def process_single_file(self, file_item: BatchFileItem, use_multi_ocr: bool = False, ocr_count: int = 3) -> Dict[str, Any]:
@@ -136,23 +183,12 @@ class BatchProcessingService:
         try:
             # 更新处理状态
             file_item.status = 'processing'
-            file_item.save()
+            file_item.save(update_fields=['status', 'updated_at'])
             
             # 调用OCR处理
-            from apps.ocr.tasks import process_image_ocr
-            
             user_id = getattr(file_item, 'created_by_id', 1)
             
-            # 同步调用OCR处理
-            ocr_task = process_image_ocr.delay(
-                file_item.file.id,
-                user_id,
-                use_multi_ocr,
-                ocr_count
-            )
-            
-            # 等待结果
-            ocr_result = ocr_task.get(timeout=300)
+            ocr_result = run_file_ocr(file_item.file_id, user_id, use_multi_ocr, ocr_count)
             
             # 更新文件项状态
             if ocr_result.get('status') == 'success':
@@ -175,10 +211,9 @@ class BatchProcessingService:
                 file_item.error_message = ocr_result.get('error', '处理失败')
             
             file_item.processing_time_seconds = time.time() - start_time
-            file_item.save()
-            
-            # 添加处理延迟
-            time.sleep(self.processing_delay)
+            file_item.save(update_fields=[
+                'status', 'ocr_result', 'error_message', 'processing_time_seconds', 'updated_at'
+            ])
             
             return {
                 'status': 'success' if file_item.status == 'completed' else 'failed',
@@ -191,7 +226,13 @@ class BatchProcessingService:
             file_item.status = 'failed'
             file_item.error_message = str(e)
             file_item.processing_time_seconds = time.time() - start_time
-            file_item.save()
+            file_item.save(update_fields=[
+                'status', 'error_message', 'processing_time_seconds', 'updated_at'
+            ])
+            
+            # 超时等情况下OCR处理没有更新文件项，按文件项状态重新统计批量任务
+            from .tasks import update_batch_job_stats
+            update_batch_job_stats(file_item.batch_job_id)
             
             logger.error(f"文件处理失败 {file_item.id}: {e}")
             
@@ -217,13 +258,20 @@ class BatchProcessingService:
     
     def calculate_progress(self, batch_job: BatchJob) -> Dict[str, Any]:
         """计算批量任务进度"""
-        file_items = BatchFileItem.objects.filter(batch_job=batch_job)
+        # 单次条件聚合代替五次 COUNT 查询
+        counts = BatchFileItem.objects.filter(batch_job=batch_job).aggregate(
+            total=Count('id'),
+            completed=Count('id', filter=Q(status='completed')),
+            failed=Count('id', filter=Q(status='failed')),
+            processing=Count('id', filter=Q(status='processing')),
+            pending=Count('id', filter=Q(status='pending')),
+        )
         
-        total = file_items.count()
-        completed = file_items.filter(status='completed').count()
-        failed = file_items.filter(status='failed').count()
-        processing = file_items.filter(status='processing').count()
-        pending = file_items.filter(status='pending').count()
+        total = counts['total']
+        completed = counts['completed']
+        failed = counts['failed']
+        processing = counts['processing']
+        pending = counts['pending']
         
         progress_percentage = (completed / total * 100) if total > 0 else 0
         
@@ -242,19 +290,19 @@ class BatchProcessingService:
         progress = self.calculate_progress(batch_job)
         
         # 获取处理时间统计
-        file_items = BatchFileItem.objects.filter(
+        timing = BatchFileItem.objects.filter(
             batch_job=batch_job,
             processing_time_seconds__isnull=False
+        ).aggregate(
+            avg_time=Avg('processing_time_seconds'),
+            min_time=Min('processing_time_seconds'),
+            max_time=Max('processing_time_seconds'),
         )
         
-        processing_times = [item.processing_time_seconds for item in file_items]
-        
-        if processing_times:
-            avg_time = sum(processing_times) / len(processing_times)
-            min_time = min(processing_times)
-            max_time = max(processing_times)
-        else:
-            avg_time = min_time = max_time = 0
+        # 没有计时记录时聚合结果为 None
+        avg_time = timing['avg_time'] or 0
+        min_time = timing['min_time'] or 0
+        max_time = timing['max_time'] or 0
         
         return {
             'batch_job_id': batch_job.id,
@@ -273,6 +321,161 @@ class BatchProcessingService:
         }
 
 
+def _ocr_in_thread(file_id, user_id, use_multi_ocr, ocr_count, force_reprocess, cancel_event):
+    """在独立线程中执行OCR处理，结束后关闭本线程的数据库连接"""
+    from apps.ocr.tasks import process_image_ocr_sync
+    try:
+        # 文件项状态与批量任务统计由调用方维护，OCR处理只写 OCR 结果
+        return process_image_ocr_sync(
+            file_id, user_id, use_multi_ocr, ocr_count, force_reprocess,
+            update_batch_items=False, cancel_event=cancel_event
+        )
+    finally:
+        connections.close_all()
+
+
+def run_file_ocr(file_id: int, user_id: int, use_multi_ocr: bool = False, ocr_count: int = 3,
+                 force_reprocess: bool = False) -> Dict[str, Any]:
+    """
+    在当前进程内执行单个文件的OCR，最多等待 BATCH_FILE_OCR_TIMEOUT 秒
+    
+    直接调用OCR处理函数而不是 Celery 任务：既不会出现任务等待任务，
+    也不会在调用方内部立即连续执行任务的重试，失败后的重试由调用方按自己的退避策略处理。
+    
+    只写入OCR结果，文件项状态与批量任务统计由调用方负责。
+    超时后工作线程无法中断，会继续等待OCR接口返回（受接口自身的请求超时约束）；
+    此时置位取消标记，线程拿到结果后直接丢弃，不会覆盖调用方重试时写入的数据。
+    
+    Returns:
+        dict: OCR处理结果，status 为 success 或 error
+        
+    Raises:
+        TimeoutError: 超过等待时间仍未完成
+    """
+    executor = ThreadPoolExecutor(max_workers=1)
+    cancel_event = threading.Event()
+    try:
+        future = executor.submit(
+            _ocr_in_thread, file_id, user_id, use_multi_ocr, ocr_count, force_reprocess, cancel_event
+        )
+        try:
+            return future.result(timeout=BATCH_FILE_OCR_TIMEOUT)
+        except TimeoutError:
+            cancel_event.set()
+            raise TimeoutError(f"OCR处理超时（{BATCH_FILE_OCR_TIMEOUT}秒）")
+    finally:
+        # 超时后不等待线程结束，OCR接口自身的请求超时会让它最终退出
+        executor.shutdown(wait=False)
+
+
+# 限流计数连续创建失败的最大次数，超过后放行
+RATE_LIMIT_MAX_RETRIES = 3
+
+
+class RateLimiter:
+    """
+    基于缓存计数的限流器（固定时间窗口）
+    生产环境缓存为 Redis，多个 worker 共享同一计数；只有窗口内调用数达到上限时才等待
+    """
+    
+    def __init__(self, max_calls: int, period: int = 1):
+        self.max_calls = max_calls
+        self.period = period
+    
+    def acquire(self, key: str):
+        """
+        获取一次调用配额，当前窗口已满时等待到下一个窗口
+        
+        计数无法写入缓存（缓存不可用或不保存数据）时直接放行，限流失效不应阻塞OCR处理
+        """
+        failures = 0
+        while True:
+            window = int(time.time() // self.period)
+            cache_key = f"ratelimit:{key}:{window}"
+            try:
+                cache.add(cache_key, 0, timeout=self.period + 1)
+                count = cache.incr(cache_key)
+            except ValueError:
+                # 计数键在 add 与 incr 之间过期时重新进入新窗口；
+                # 连续失败说明缓存不保存计数（如 DummyCache），不再重试
+                failures += 1
+                if failures >= RATE_LIMIT_MAX_RETRIES:
+                    logger.warning(f"限流计数无法创建，跳过限流: {key}")
+                    return
+                continue
+            except Exception as e:
+                logger.warning(f"限流缓存不可用，跳过限流: {key}, 错误: {e}")
+                return
+            if count <= self.max_calls:
+                return
+            time.sleep(max((window + 1) * self.period - time.time(), 0))
+
+
+# 批量OCR调用限流（每秒最多调用次数）
+ocr_rate_limiter = RateLimiter(getattr(settings, 'BATCH_OCR_RATE_LIMIT', 30))
+
+# 空白图片判定：Otsu 二值化后前景（深色）像素占比低于该值时跳过OCR
+BLANK_IMAGE_DENSITY_THRESHOLD = getattr(settings, 'BATCH_BLANK_IMAGE_DENSITY', 0.005)
+# 判定时先缩小到该尺寸以内，统计直方图不需要原始分辨率
+BLANK_IMAGE_SCREEN_SIZE = (512, 512)
+
+
+def _otsu_threshold(histogram: List[int]) -> int:
+    """根据 256 级灰度直方图计算 Otsu 阈值（类间方差最大的灰度级）"""
+    total = sum(histogram)
+    sum_all = sum(level * count for level, count in enumerate(histogram))
+    
+    weight_bg = 0
+    sum_bg = 0
+    best_threshold = 0
+    best_variance = 0.0
+    for level, count in enumerate(histogram):
+        weight_bg += count
+        if weight_bg == 0:
+            continue
+        weight_fg = total - weight_bg
+        if weight_fg == 0:
+            break
+        sum_bg += level * count
+        mean_bg = sum_bg / weight_bg
+        mean_fg = (sum_all - sum_bg) / weight_fg
+        variance = weight_bg * weight_fg * (mean_bg - mean_fg) ** 2
+        if variance > best_variance:
+            best_variance = variance
+            best_threshold = level
+    return best_threshold
+
+
+def foreground_density(image_path: str) -> float:
+    """
+    计算图片前景（深色）像素占比
+    
+    使用缩小后的灰度图直方图（Pillow C 实现）做 Otsu 二值化，
+    单一灰度的图片没有前景，占比为 0。
+    """
+    with Image.open(image_path) as image:
+        # JPEG 直接按缩小比例解码，避免解码完整分辨率
+        image.draft('L', BLANK_IMAGE_SCREEN_SIZE)
+        gray = image.convert('L')
+        gray.thumbnail(BLANK_IMAGE_SCREEN_SIZE)
+        histogram = gray.histogram()
+    
+    total = sum(histogram)
+    if total == 0:
+        return 0.0
+    threshold = _otsu_threshold(histogram)
+    return sum(histogram[:threshold + 1]) / total
+
+
+def is_blank_image(image_path: str) -> bool:
+    """判断图片是否为空白页（前景占比过低），无法读取时按非空白处理"""
+    try:
+        return foreground_density(image_path) < BLANK_IMAGE_DENSITY_THRESHOLD
+    except Exception as e:
+        logger.warning(f"空白图片检测失败 {image_path}: {e}")
+        return False
+
+
 def get_batch_processing_service() -> BatchProcessingService:
     """获取批量处理服务实例"""
     return BatchProcessingService()
@@ -4,48 +4,269 @@
 import os
 import time
 import logging
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
 from datetime import datetime, timedelta
-from celery import shared_task, group
+from celery import shared_task, group, chord
 from django.utils import timezone
-from django.db import transaction
+from django.db import connections, transaction
+from django.db.models import Count
+from apps.ocr.models import OCRResult
+from apps.ocr.tasks import enhanced_multi_ocr_process, single_ocr_process
 from .models import BatchJob, BatchFileItem
+from .services import is_blank_image, ocr_rate_limiter, run_file_ocr
+
+try:
+    from .consumers import (
+        send_batch_job_completed as ws_send_completed,
+        send_batch_progress_update as ws_send_progress,
+        send_file_processing_update as ws_send_file,
+        flush_batch_updates as ws_flush_updates,
+    )
+except ImportError:  # WebSocket 依赖（channels）为可选，缺失时跳过实时推送
+    ws_send_completed = ws_send_progress = ws_send_file = ws_flush_updates = None
 
 logger = logging.getLogger(__name__)
 
+# start_batch_ocr_processing 中终态文件项的批量写入字段、批次大小与最长缓冲时间（秒）
+ITEM_UPDATE_FIELDS = ['status', 'ocr_result', 'error_message', 'updated_at']
+ITEM_UPDATE_BATCH_SIZE = 50
+ITEM_UPDATE_MAX_DELAY = 5
+
+# 部署环境同步处理时同时进行的OCR接口调用数
+SYNC_OCR_CONCURRENCY = 4
+
+
+def _count_items_by_status(batch_job_id) -> dict:
+    """按状态分组统计文件项数量（单次 GROUP BY 查询），返回 {status: count}"""
+    # 清除默认排序，否则 processing_order 会进入 GROUP BY
+    return dict(
+        BatchFileItem.objects.filter(batch_job_id=batch_job_id)
+        .order_by()
+        .values_list('status')
+        .annotate(count=Count('id'))
+    )
+
 
 # WebSocket通信函数
 def send_batch_progress_update(batch_job_id: int, progress_data: dict):
     """发送批量任务进度更新"""
-    try:
-        from .consumers import send_batch_progress_update as ws_send_progress
-        ws_send_progress(batch_job_id, progress_data)
-    except ImportError:
+    if ws_send_progress is None:
         # 如果WebSocket依赖不可用，记录警告但不影响功能
         logger.warning("WebSocket依赖不可用，跳过实时进度更新")
+        return
+    try:
+        ws_send_progress(batch_job_id, progress_data)
     except Exception as e:
         logger.error(f"发送WebSocket进度更新失败: {e}")
 
 def send_file_processing_update(batch_job_id: int, file_data: dict):
     """发送文件处理状态更新"""
+    if ws_send_file is None:
+        logger.warning("WebSocket依赖不可用，跳过文件状态更新")
+        return
     try:
-        from .consumers import send_file_processing_update as ws_send_file
         ws_send_file(batch_job_id, file_data)
-    except ImportError:
-        logger.warning("WebSocket依赖不可用，跳过文件状态更新")
     except Exception as e:
         logger.error(f"发送WebSocket文件更新失败: {e}")
 
 def send_batch_job_completed(batch_job_id: int, completion_data: dict):
     """发送批量任务完成消息"""
+    if ws_send_completed is None:
+        logger.warning("WebSocket依赖不可用，跳过任务完成通知")
+        return
     try:
-        from .consumers import send_batch_job_completed as ws_send_completed
         ws_send_completed(batch_job_id, completion_data)
-    except ImportError:
-        logger.warning("WebSocket依赖不可用，跳过任务完成通知")
     except Exception as e:
         logger.error(f"发送WebSocket任务完成通知失败: {e}")
 
 
+def flush_websocket_updates():
+    """
+    立即发送缓冲中的WebSocket消息
+
+    消息默认由后台定时器合并发送；worker 子进程退出（max_tasks_per_child、warm shutdown）
+    时定时器线程随之结束，因此任务在返回前显式刷新，不把消息留在缓冲中。
+    """
+    if ws_flush_updates is None:
+        return
+    try:
+        ws_flush_updates()
+    except Exception as e:
+        logger.error(f"发送缓冲的WebSocket消息失败: {e}")
+
+
+def _batch_job_cancelled(batch_job_id) -> bool:
+    """批量任务是否已被取消"""
+    return BatchJob.objects.filter(id=batch_job_id, status='cancelled').exists()
+
+
+class _ItemUpdateBuffer:
+    """缓冲已进入终态的文件项，攒够一批或超时后 bulk_update 写入并刷新批量任务进度"""
+
+    def __init__(self, batch_job):
+        self.batch_job = batch_job
+        self.items = []
+        self.ticks = 0
+        self.last_flush = time.monotonic()
+
+    def add(self, file_item):
+        """登记待写入的文件项（bulk_update 不会自动更新 auto_now 字段）"""
+        file_item.updated_at = timezone.now()
+        self.items.append(file_item)
+
+    def tick(self):
+        """每处理完一个文件调用一次，到达批次大小或最长缓冲时间时写入"""
+        self.ticks += 1
+        if self.ticks >= ITEM_UPDATE_BATCH_SIZE or time.monotonic() - self.last_flush >= ITEM_UPDATE_MAX_DELAY:
+            self.flush()
+
+    def flush(self):
+        """写入缓冲的文件项并更新批量任务进度"""
+        if not self.ticks and not self.items:
+            return
+        if self.items:
+            BatchFileItem.objects.bulk_update(self.items, ITEM_UPDATE_FIELDS, batch_size=ITEM_UPDATE_BATCH_SIZE)
+            self.items = []
+        self.ticks = 0
+        self.last_flush = time.monotonic()
+        update_batch_job_progress(self.batch_job)
+
+
+def _prepare_sync_item(file_item, batch_job, item_updates, force_reprocess, use_multi_ocr, ocr_count):
+    """
+    同步批量处理：标记文件项为处理中并创建待填充的OCR结果记录
+
+    Returns:
+        OCRResult: 需要调用OCR接口时返回新建的记录；空白页或准备失败时返回 None（已登记终态）
+    """
+    try:
+        logger.debug("开始处理文件: %s", file_item.file.original_name)
+
+        # 更新文件项状态（立即写入，前端需要看到处理中状态）
+        file_item.status = 'processing'
+        file_item.save(update_fields=['status', 'updated_at'])
+
+        # 发送WebSocket文件状态更新
+        send_file_processing_update(batch_job.id, {
+            'file_id': file_item.id,
+            'batch_job_id': batch_job.id,
+            'status': 'processing',
+            'filename': file_item.file.original_name
+        })
+
+        # 空白页不调用OCR接口，直接跳过
+        if is_blank_image(file_item.file.file.path):
+            logger.debug("空白图片，跳过识别: %s", file_item.file.original_name)
+            file_item.status = 'skipped'
+            file_item.error_message = '空白图片，已跳过识别'
+            item_updates.add(file_item)
+            send_file_processing_update(batch_job.id, {
+                'file_id': file_item.id,
+                'batch_job_id': batch_job.id,
+                'status': 'skipped',
+                'filename': file_item.file.original_name
+            })
+            item_updates.tick()
+            return None
+
+        # 直接进行OCR处理，不再进行复用检查
+        # 如果强制重新处理，删除现有的OCR结果
+        if force_reprocess:
+            logger.debug("强制重新识别: %s", file_item.file.original_name)
+            existing_ocr = OCRResult.objects.filter(
+                file=file_item.file
+            ).first()
+            if existing_ocr:
+                existing_ocr.delete()
+
+        # 创建新的OCR结果记录
+        ocr_result = OCRResult.objects.create(
+            file=file_item.file,
+            status='pending',
+            ocr_attempts=ocr_count if use_multi_ocr else 1,
+            created_by=batch_job.created_by
+        )
+        file_item.ocr_result = ocr_result
+        return ocr_result
+
+    except Exception as e:
+        logger.error(f"处理文件失败: {file_item.file.original_name}, 错误: {e}")
+        file_item.status = 'failed'
+        file_item.error_message = str(e)
+        item_updates.add(file_item)
+
+        # 更新批量任务进度
+        item_updates.tick()
+        return None
+
+
+def _run_sync_ocr(image_path, use_multi_ocr, ocr_count):
+    """在线程池中调用OCR接口（只做接口调用，不写数据库）"""
+    try:
+        # 只在接近API调用上限时等待
+        ocr_rate_limiter.acquire('batch_ocr')
+
+        # 直接调用OCR处理函数
+        if use_multi_ocr:
+            return enhanced_multi_ocr_process(image_path, ocr_count)
+        return single_ocr_process(image_path)
+    finally:
+        # 读取AI配置时可能在本线程打开了数据库连接
+        connections.close_all()
+
+
+def _finish_sync_item(future, file_item, ocr_result, batch_job, item_updates):
+    """在当前线程写回单个文件的OCR结果并登记文件项终态"""
+    try:
+        result = future.result()
+
+        # 把识别结果写回本次创建的OCR结果记录（不再另建一条，避免遗留 pending 记录）
+        ocr_result.phone = result.get('phone', '')
+        ocr_result.date = result.get('date', '')
+        ocr_result.temperature = result.get('temperature', '')
+        ocr_result.humidity = result.get('humidity', '')
+        ocr_result.check_type = result.get('check_type', 'initial')
+        ocr_result.points_data = result.get('points_data', {})
+        ocr_result.raw_response = result.get('raw_response', '')
+        ocr_result.confidence_score = result.get('confidence_score', 0.0)
+        ocr_result.ocr_attempts = result.get('ocr_attempts', 1)
+        ocr_result.has_conflicts = result.get('has_conflicts', False)
+        ocr_result.conflict_details = result.get('conflict_details', {})
+        ocr_result.status = 'completed'
+        ocr_result.save(update_fields=[
+            'phone', 'date', 'temperature', 'humidity', 'check_type', 'points_data',
+            'raw_response', 'confidence_score', 'ocr_attempts', 'has_conflicts',
+            'conflict_details', 'status', 'updated_at'
+        ])
+
+        # OCR结果在准备阶段已关联到文件项
+        file_item.status = 'completed'
+
+        # 发送WebSocket文件完成更新
+        send_file_processing_update(batch_job.id, {
+            'file_id': file_item.id,
+            'batch_job_id': batch_job.id,
+            'status': 'completed',
+            'filename': file_item.file.original_name,
+            'ocr_result_id': ocr_result.id
+        })
+
+    except Exception as ocr_error:
+        logger.error(f"OCR处理失败: {file_item.file.original_name}, 错误: {ocr_error}")
+        OCRResult.objects.filter(id=ocr_result.id).update(
+            status='failed',
+            error_message=str(ocr_error),
+            updated_at=timezone.now()
+        )
+        file_item.status = 'failed'
+        file_item.error_message = str(ocr_error)
+
+    item_updates.add(file_item)
+
+    # 攒够一批或距上次写入过久时批量写入并更新批量任务进度
+    item_updates.tick()
+
+
 def start_batch_ocr_processing(batch_job_id, force_reprocess=False):
     """
     启动批量OCR处理（非异步版本，用于立即启动）
@@ -55,7 +276,6 @@ def start_batch_ocr_processing(batch_job_id, force_reprocess=False):
         batch_job_id: 批量任务ID
         force_reprocess: 是否强制重新处理（不使用已有OCR结果）
     """
-    import os
 
     try:
         # 获取批量任务
@@ -66,18 +286,22 @@ def start_batch_ocr_processing(batch_job_id, force_reprocess=False):
         batch_job.started_at = timezone.now()
         batch_job.save()
 
-        print(f"开始批量OCR处理: {batch_job.name}")
+        logger.info(f"开始批量OCR处理: {batch_job.name}")
 
         # 获取待处理的文件项
+        # 一次连表取出循环中用到的文件字段，避免每个文件再查一次文件表
         file_items = batch_job.batchfileitem_set.filter(
             status='pending'
+        ).select_related('file').only(
+            'id', 'batch_job', 'status', 'processing_order', 'error_message', 'ocr_result',
+            'file__id', 'file__original_name', 'file__file'
         ).order_by('processing_order')
 
         if not file_items.exists():
             batch_job.status = 'completed'
             batch_job.completed_at = timezone.now()
             batch_job.save()
-            print("没有待处理的文件")
+            logger.info(f"批量任务 {batch_job.id} 没有待处理的文件")
             return
 
         # 获取处理设置
@@ -85,170 +309,49 @@ def start_batch_ocr_processing(batch_job_id, force_reprocess=False):
         use_multi_ocr = settings.get('use_multi_ocr', False)
         ocr_count = settings.get('ocr_count', 3)
 
-        # 在部署环境中使用更保守的处理方式
-        is_deployment = os.getenv('REPL_DEPLOYMENT') == '1'
-        if is_deployment:
-            print("部署环境：使用保守的批量处理模式")
-            # 减少并发，增加延迟
-            ocr_count = min(ocr_count, 2)  # 限制OCR次数
+        # 非部署环境有 Celery worker：一次性分发任务组，由 worker 并行处理
+        if os.getenv('REPL_DEPLOYMENT') != '1':
+            item_ids = list(file_items.values_list('id', flat=True))
+            result = dispatch_batch_items(batch_job_id, item_ids, use_multi_ocr, ocr_count, force_reprocess)
+            logger.info(f"批量OCR任务组已分发: {result.id}，共 {len(item_ids)} 个文件")
+            return
 
-        # 为每个文件项启动OCR处理
-        for file_item in file_items:
-            try:
-                print(f"开始处理文件: {file_item.file.original_name}")
-
-                # 更新文件项状态
-                file_item.status = 'processing'
-                file_item.save()
-                
-                # 发送WebSocket文件状态更新
-                send_file_processing_update(batch_job.id, {
-                    'file_id': file_item.id,
-                    'batch_job_id': batch_job.id,
-                    'status': 'processing',
-                    'filename': file_item.file.original_name
-                })
+        # 部署环境没有独立 worker，在当前进程内处理，使用更保守的处理方式
+        logger.info("部署环境：使用保守的批量处理模式")
+        # 减少并发，增加延迟
+        ocr_count = min(ocr_count, 2)  # 限制OCR次数
 
-                # 直接进行OCR处理，不再进行复用检查
-                from apps.ocr.models import OCRResult
-
-                # 如果强制重新处理，删除现有的OCR结果
-                if force_reprocess:
-                    print(f"强制重新识别: {file_item.file.original_name}")
-                    existing_ocr = OCRResult.objects.filter(
-                        file=file_item.file
-                    ).first()
-                    if existing_ocr:
-                        existing_ocr.delete()
-
-                # 创建新的OCR结果记录
-                ocr_result = OCRResult.objects.create(
-                    file=file_item.file,
-                    status='pending',
-                    ocr_attempts=ocr_count if use_multi_ocr else 1,
-                    created_by=batch_job.created_by
+        # 终态文件项先缓冲，按批次用 bulk_update 写入
+        item_updates = _ItemUpdateBuffer(batch_job)
+
+        # OCR接口调用主要耗时在网络等待：在线程池中并发调用，数据库读写仍在当前线程完成
+        in_flight = {}
+        with ThreadPoolExecutor(max_workers=SYNC_OCR_CONCURRENCY) as executor:
+            for file_item in file_items:
+                ocr_result = _prepare_sync_item(
+                    file_item, batch_job, item_updates, force_reprocess, use_multi_ocr, ocr_count
                 )
-                file_item.ocr_result = ocr_result
-                file_item.save()
+                if ocr_result is None:
+                    continue
 
-                # 调用现有的OCR处理任务 - 增强错误处理
-                from apps.ocr.tasks import process_image_ocr
+                future = executor.submit(_run_sync_ocr, file_item.file.file.path, use_multi_ocr, ocr_count)
+                in_flight[future] = (file_item, ocr_result)
 
-                try:
-                    if is_deployment:
-                        # 部署环境：同步处理以避免超时问题
-                        print(f"部署环境：同步处理 {file_item.file.original_name}")
-
-                        # 直接调用OCR处理函数
-                        if use_multi_ocr:
-                            from apps.ocr.tasks import enhanced_multi_ocr_process
-                            result = enhanced_multi_ocr_process(
-                                file_item.file.file.path,
-                                ocr_count
-                            )
-                        else:
-                            from apps.ocr.tasks import single_ocr_process
-                            result = single_ocr_process(file_item.file.file.path)
-
-                        # 创建OCR结果记录
-                        from apps.ocr.models import OCRResult
-                        ocr_result = OCRResult.objects.create(
-                            file=file_item.file,
-                            phone=result.get('phone', ''),
-                            date=result.get('date', ''),
-                            temperature=result.get('temperature', ''),
-                            humidity=result.get('humidity', ''),
-                            check_type=result.get('check_type', 'initial'),
-                            points_data=result.get('points_data', {}),
-                            raw_response=result.get('raw_response', ''),
-                            confidence_score=result.get('confidence_score', 0.0),
-                            ocr_attempts=result.get('ocr_attempts', 1),
-                            has_conflicts=result.get('has_conflicts', False),
-                            conflict_details=result.get('conflict_details', {}),
-                            status='completed',
-                            created_by=batch_job.created_by
-                        )
-
-                        # 包装结果
-                        result = {
-                            'status': 'success',
-                            'ocr_result_id': ocr_result.id
-                        }
-
-                        # 更新文件项状态
-                        if result.get('status') == 'success':
-                            file_item.status = 'completed'
-                            # 关联OCR结果
-                            if 'ocr_result_id' in result:
-                                from apps.ocr.models import OCRResult
-                                try:
-                                    ocr_result_obj = OCRResult.objects.get(id=result['ocr_result_id'])
-                                    file_item.ocr_result = ocr_result_obj
-                                except OCRResult.DoesNotExist:
-                                    logger.warning(f"OCR结果 {result['ocr_result_id']} 不存在")
-                            
-                            # 发送WebSocket文件完成更新
-                            send_file_processing_update(batch_job.id, {
-                                'file_id': file_item.id,
-                                'batch_job_id': batch_job.id,
-                                'status': 'completed',
-                                'filename': file_item.file.original_name,
-                                'ocr_result_id': result.get('ocr_result_id')
-                            })
-                        else:
-                            file_item.status = 'failed'
-                            file_item.error_message = result.get('error', '处理失败')
-                            
-                            # 发送WebSocket文件失败更新
-                            send_file_processing_update(batch_job.id, {
-                                'file_id': file_item.id,
-                                'batch_job_id': batch_job.id,
-                                'status': 'failed',
-                                'filename': file_item.file.original_name,
-                                'error_message': result.get('error', '处理失败')
-                            })
-
-                        file_item.save()
-
-                    else:
-                        # 开发环境：异步处理
-                        task = process_image_ocr.delay(
-                            file_item.file.id,
-                            batch_job.created_by.id,
-                            use_multi_ocr,
-                            ocr_count,
-                            force_reprocess
-                        )
-                        print(f"启动OCR任务: {task.id} for {file_item.file.original_name}")
-
-                except Exception as ocr_error:
-                    print(f"OCR处理失败: {ocr_error}")
-                    file_item.status = 'failed'
-                    file_item.error_message = str(ocr_error)
-                    file_item.save()
-
-                # 更新批量任务进度
-                update_batch_job_progress(batch_job)
-
-                # 在部署环境中添加延迟以避免API限制
-                if is_deployment:
-                    import time
-                    time.sleep(2)  # 2秒延迟
+                # 在途请求达到并发上限时，先处理已完成的结果再提交下一个文件
+                if len(in_flight) >= SYNC_OCR_CONCURRENCY:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        _finish_sync_item(future, *in_flight.pop(future), batch_job, item_updates)
 
-            except Exception as e:
-                print(f"处理文件失败: {file_item.file.original_name}, 错误: {e}")
-                file_item.status = 'failed'
-                file_item.error_message = str(e)
-                file_item.save()
+            for future in as_completed(list(in_flight)):
+                _finish_sync_item(future, *in_flight.pop(future), batch_job, item_updates)
 
-                # 更新批量任务进度
-                update_batch_job_progress(batch_job)
-                continue
+        item_updates.flush()
 
-        print(f"批量OCR处理启动完成: {batch_job.name}")
+        logger.info(f"批量OCR处理完成: {batch_job.name}")
 
     except Exception as e:
-        print(f"启动批量OCR处理失败: {e}")
+        logger.error(f"启动批量OCR处理失败: {e}", exc_info=True)
         try:
             batch_job = BatchJob.objects.get(id=batch_job_id)
             batch_job.status = 'failed'
@@ -259,24 +362,22 @@ def start_batch_ocr_processing(batch_job_id, force_reprocess=False):
 
 def update_batch_job_progress(batch_job):
     """更新批量任务进度"""
-    from django.db import transaction
-    
     with transaction.atomic():
         # 刷新批量任务以获取最新状态
         batch_job.refresh_from_db()
         
         # 重新计算所有文件项的状态
-        file_items = batch_job.batchfileitem_set.all()
-        total_files = file_items.count()
+        status_counts = _count_items_by_status(batch_job.id)
+        total_files = sum(status_counts.values())
 
         if total_files == 0:
             return
 
         # 统计各种状态的文件数量
-        completed_files = file_items.filter(status='completed').count()
-        failed_files = file_items.filter(status='failed').count()
-        skipped_files = file_items.filter(status='skipped').count()
-        processing_files = file_items.filter(status='processing').count()
+        completed_files = status_counts.get('completed', 0)
+        failed_files = status_counts.get('failed', 0)
+        skipped_files = status_counts.get('skipped', 0)
+        processing_files = status_counts.get('processing', 0)
         
         # 已处理的文件数量（包括完成、失败、跳过）
         processed_files = completed_files + failed_files + skipped_files
@@ -292,10 +393,16 @@ def update_batch_job_progress(batch_job):
                 batch_job.status = 'completed'
                 batch_job.completed_at = timezone.now()
         
-        batch_job.save()
+        batch_job.save(update_fields=[
+            'total_files', 'processed_files', 'failed_files', 'status', 'completed_at', 'updated_at'
+        ])
         
         progress_percentage = batch_job.progress_percentage
-        print(f"任务进度更新: {processed_files}/{total_files} ({progress_percentage:.1f}%) - 完成:{completed_files}, 失败:{failed_files}, 跳过:{skipped_files}, 处理中:{processing_files}")
+        logger.debug(
+            "任务进度更新: %d/%d (%.1f%%) - 完成:%d, 失败:%d, 跳过:%d, 处理中:%d",
+            processed_files, total_files, progress_percentage,
+            completed_files, failed_files, skipped_files, processing_files
+        )
         
         # 发送WebSocket进度更新
         send_batch_progress_update(batch_job.id, {
@@ -320,6 +427,32 @@ def update_batch_job_progress(batch_job):
             })
 
 
+def dispatch_batch_items(batch_job_id, item_ids, use_multi_ocr=False, ocr_count=3, force_reprocess=False):
+    """
+    以任务组一次性分发批量文件项，全部结束后由 finalize_batch 回调收尾
+
+    Args:
+        batch_job_id: 批量任务ID
+        item_ids: 待处理的文件项ID列表（按处理顺序）
+        use_multi_ocr: 是否使用多重OCR
+        ocr_count: OCR次数
+        force_reprocess: 是否强制重新处理（不使用已有OCR结果）
+
+    Returns:
+        AsyncResult: chord 回调任务的结果
+    """
+    job_group = group(
+        process_batch_item.s(
+            item_id,
+            batch_job_id,
+            use_multi_ocr,
+            ocr_count,
+            force_reprocess
+        ) for item_id in item_ids
+    )
+    return chord(job_group)(finalize_batch.s(batch_job_id))
+
+
 @shared_task(bind=True)
 def start_batch_processing(self, batch_job_id, force_reprocess=False):
     """
@@ -339,12 +472,13 @@ def start_batch_processing(self, batch_job_id, force_reprocess=False):
         batch_job.save()
         
         # 获取待处理的文件项
-        file_items = BatchFileItem.objects.filter(
+        # 子任务只需要文件项ID
+        item_ids = list(BatchFileItem.objects.filter(
             batch_job=batch_job,
             status='pending'
-        ).order_by('processing_order')
+        ).order_by('processing_order').values_list('id', flat=True))
         
-        if not file_items.exists():
+        if not item_ids:
             batch_job.status = 'completed'
             batch_job.completed_at = timezone.now()
             batch_job.save()
@@ -358,28 +492,14 @@ def start_batch_processing(self, batch_job_id, force_reprocess=False):
         use_multi_ocr = settings.get('use_multi_ocr', False)
         ocr_count = settings.get('ocr_count', 3)
         
-        # 创建子任务组
-        job_group = group(
-            process_batch_item.s(
-                item.id,
-                batch_job_id,
-                use_multi_ocr,
-                ocr_count,
-                force_reprocess
-            ) for item in file_items
-        )
-        
-        # 执行子任务组
-        result = job_group.apply_async()
-        
-        # 启动监控任务
-        monitor_batch_progress.delay(batch_job_id, result.id)
+        # 分发子任务组
+        result = dispatch_batch_items(batch_job_id, item_ids, use_multi_ocr, ocr_count, force_reprocess)
         
         return {
             'status': 'started',
             'batch_job_id': batch_job_id,
-            'total_files': file_items.count(),
-            'group_id': result.id
+            'total_files': len(item_ids),
+            'group_id': result.parent.id
         }
         
     except BatchJob.DoesNotExist:
@@ -405,6 +525,9 @@ def process_batch_item(self, item_id, batch_job_id, use_multi_ocr=False, ocr_cou
     """
     处理批量文件项 - 移植自GUI项目的批量处理逻辑
 
+    文件项状态只由本任务维护：失败后等待重试期间文件项回到待处理，
+    重试次数用尽才标记为失败并重新统计，批量任务不会在重试前被判定为完成。
+
     Args:
         item_id: 文件项ID
         batch_job_id: 批量任务ID
@@ -418,35 +541,44 @@ def process_batch_item(self, item_id, batch_job_id, use_multi_ocr=False, ocr_cou
         # 获取文件项
         file_item = BatchFileItem.objects.get(id=item_id)
 
+        # 批量任务已取消时跳过（cancel_batch_processing 会把待处理项标记为 skipped，
+        # 取消时正在处理或等待重试的文件项在这里跳过）
+        if file_item.status == 'skipped' or _batch_job_cancelled(batch_job_id):
+            if file_item.status != 'skipped':
+                file_item.status = 'skipped'
+                file_item.save(update_fields=['status', 'updated_at'])
+            return {
+                'status': 'skipped',
+                'item_id': item_id
+            }
+
         # 更新处理状态
         file_item.status = 'processing'
-        file_item.save()
+        file_item.save(update_fields=['status', 'updated_at'])
 
         # 代理设置已移除
 
-        # 调用OCR处理任务
-        from apps.ocr.tasks import process_image_ocr
-
         # 获取用户ID（如果文件项没有创建者，使用批量任务的创建者）
         user_id = getattr(file_item, 'created_by_id', None) or getattr(file_item.batch_job, 'created_by_id', 1)
 
-        ocr_task = process_image_ocr.delay(
-            file_item.file.id,
+        # 只在接近API调用上限时等待（取代固定延迟）
+        ocr_rate_limiter.acquire('batch_ocr')
+
+        # 在本任务内直接执行OCR（带超时）：批量并发由 start_batch_processing 的任务组提供，
+        # 子任务内再 delay().get() 会让两个 worker 互相等待，worker 占满时还会死锁
+        ocr_result = run_file_ocr(
+            file_item.file_id,
             user_id,
             use_multi_ocr,
             ocr_count,
             force_reprocess
         )
 
-        # 等待OCR任务完成
-        ocr_result = ocr_task.get(timeout=300)  # 5分钟超时
-
         # 更新文件项状态
         if ocr_result.get('status') == 'success':
             file_item.status = 'completed'
             # 关联OCR结果
             if 'ocr_result_id' in ocr_result:
-                from apps.ocr.models import OCRResult
                 try:
                     ocr_result_obj = OCRResult.objects.get(id=ocr_result['ocr_result_id'])
                     file_item.ocr_result = ocr_result_obj
@@ -462,18 +594,15 @@ def process_batch_item(self, item_id, batch_job_id, use_multi_ocr=False, ocr_cou
             except Exception as e:
                 logger.warning(f"点位学习更新失败: {e}")
         else:
-            file_item.status = 'failed'
-            file_item.error_message = ocr_result.get('error', '处理失败')
+            # 交给下方的异常处理：按本任务的退避策略重试，重试用尽后标记失败
+            raise Exception(ocr_result.get('error', '处理失败'))
 
         file_item.processing_time_seconds = time.time() - start_time
-        file_item.save()
+        file_item.save(update_fields=['status', 'ocr_result', 'processing_time_seconds', 'updated_at'])
 
         # 更新批量任务统计
         update_batch_job_stats(batch_job_id)
 
-        # 添加延迟避免API调用过于频繁（移植自GUI项目）
-        time.sleep(1)
-
         return {
             'status': 'success',
             'item_id': item_id,
@@ -488,68 +617,70 @@ def process_batch_item(self, item_id, batch_job_id, use_multi_ocr=False, ocr_cou
             'error': '文件项不存在'
         }
     except Exception as e:
+        cancelled = _batch_job_cancelled(batch_job_id)
+        will_retry = self.request.retries < self.max_retries and not cancelled
+
         # 更新错误状态
         if 'file_item' in locals():
-            file_item.status = 'failed'
+            if will_retry:
+                # 等待重试期间回到待处理，不计入已处理数
+                file_item.status = 'pending'
+            elif cancelled:
+                file_item.status = 'skipped'
+            else:
+                file_item.status = 'failed'
             file_item.error_message = str(e)
             file_item.processing_time_seconds = time.time() - start_time
-            file_item.save()
+            file_item.save(update_fields=[
+                'status', 'error_message', 'processing_time_seconds', 'updated_at'
+            ])
 
-            # 更新批量任务统计
-            update_batch_job_stats(batch_job_id)
+            # 文件项进入终态后更新批量任务统计
+            if not will_retry:
+                update_batch_job_stats(batch_job_id)
 
         # 重试机制
-        if self.request.retries < self.max_retries:
+        if will_retry:
             raise self.retry(countdown=60 * (self.request.retries + 1))
 
         return {
-            'status': 'error',
+            'status': 'skipped' if cancelled else 'error',
             'error': str(e),
             'item_id': item_id
         }
+    finally:
+        flush_websocket_updates()
 
 
 @shared_task
-def monitor_batch_progress(batch_job_id, group_id):
+def finalize_batch(results, batch_job_id):
     """
-    监控批量处理进度
-    
+    批量任务收尾（作为任务组的 chord 回调，在所有文件项处理结束后执行一次）
+
+    update_batch_job_stats 只在所有文件项完成或失败时切换任务状态；
+    有被跳过的文件项时由这里把仍在运行的任务标记为完成。
+
     Args:
+        results: 各文件项子任务的返回结果
         batch_job_id: 批量任务ID
-        group_id: 任务组ID
     """
     try:
-        batch_job = BatchJob.objects.get(id=batch_job_id)
-        
-        # 等待所有子任务完成
-        from celery.result import GroupResult
-        group_result = GroupResult.restore(group_id)
-        
-        # 定期检查进度
-        while not group_result.ready():
-            time.sleep(10)  # 每10秒检查一次
-            
-            # 更新进度
-            update_batch_job_stats(batch_job_id)
-            
-            # 检查是否被取消
-            batch_job.refresh_from_db()
-            if batch_job.status == 'cancelled':
-                group_result.revoke(terminate=True)
-                break
-        
         # 最终更新状态
         update_batch_job_stats(batch_job_id)
         
-        # 设置完成状态
-        batch_job.refresh_from_db()
-        if batch_job.status == 'running':
-            if batch_job.failed_files > 0:
-                batch_job.status = 'completed_with_errors'
-            else:
-                batch_job.status = 'completed'
-            batch_job.completed_at = timezone.now()
-            batch_job.save()
+        # 设置完成状态（条件更新：已完成、已取消的任务保持不变）
+        completed = BatchJob.objects.filter(id=batch_job_id, status='running').update(
+            status='completed', completed_at=timezone.now()
+        )
+        batch_job = BatchJob.objects.get(id=batch_job_id)
+        if completed:
+            send_batch_job_completed(batch_job_id, {
+                'batch_job_id': batch_job_id,
+                'status': 'completed',
+                'total_files': batch_job.total_files,
+                'processed_files': batch_job.processed_files,
+                'failed_files': batch_job.failed_files
+            })
         
         return {
             'status': 'completed',
@@ -563,6 +694,8 @@ def monitor_batch_progress(batch_job_id, group_id):
             'status': 'error',
             'error': str(e)
         }
+    finally:
+        flush_websocket_updates()
 
 
 def update_batch_job_stats(batch_job_id):
@@ -573,68 +706,78 @@ def update_batch_job_stats(batch_job_id):
         batch_job_id: 批量任务ID
     """
     try:
-        with transaction.atomic():
-            batch_job = BatchJob.objects.select_for_update().get(id=batch_job_id)
-
-            # 统计文件项状态
-            file_items = BatchFileItem.objects.filter(batch_job=batch_job)
-            total_files = file_items.count()
-            completed_count = file_items.filter(status='completed').count()
-            failed_count = file_items.filter(status='failed').count()
-            processing_count = file_items.filter(status='processing').count()
-            pending_count = file_items.filter(status='pending').count()
-
-            # 已处理的文件数量（包括完成、失败）
-            processed_count = completed_count + failed_count
-
-            # 更新统计
-            batch_job.total_files = total_files
-            batch_job.processed_files = processed_count
-            batch_job.failed_files = failed_count
-
-            # 计算预计完成时间
-            if batch_job.started_at and processed_count > 0:
-                elapsed_time = (timezone.now() - batch_job.started_at).total_seconds()
-                avg_time_per_file = elapsed_time / processed_count
-                remaining_files = total_files - processed_count
-
-                if remaining_files > 0:
-                    estimated_remaining_time = avg_time_per_file * remaining_files
-                    batch_job.estimated_completion = timezone.now() + timedelta(seconds=estimated_remaining_time)
-
-            # 检查是否所有文件都处理完成
-            if processed_count == total_files and processing_count == 0:
-                if batch_job.status == 'running':
-                    batch_job.status = 'completed'
-                    batch_job.completed_at = timezone.now()
-
-                    # 发送任务完成通知
-                    send_batch_job_completed(batch_job.id, {
-                        'batch_job_id': batch_job.id,
-                        'status': 'completed',
-                        'total_files': total_files,
-                        'processed_files': processed_count,
-                        'failed_files': failed_count,
-                        'completed_files': completed_count
-                    })
+        # 只读取计算所需字段，不加行锁
+        job_state = BatchJob.objects.filter(id=batch_job_id).values('status', 'started_at').first()
+        if job_state is None:
+            logger.warning(f"批量任务 {batch_job_id} 不存在，跳过统计更新")
+            return
 
-            batch_job.save()
+        # 统计文件项状态
+        status_counts = _count_items_by_status(batch_job_id)
+        total_files = sum(status_counts.values())
+        completed_count = status_counts.get('completed', 0)
+        failed_count = status_counts.get('failed', 0)
+        processing_count = status_counts.get('processing', 0)
+        pending_count = status_counts.get('pending', 0)
 
-            # 发送进度更新
-            progress_percentage = batch_job.progress_percentage
-            send_batch_progress_update(batch_job.id, {
-                'batch_job_id': batch_job.id,
-                'progress_percentage': progress_percentage,
-                'processed_files': processed_count,
-                'failed_files': failed_count,
-                'status': batch_job.status,
-                'total_files': total_files,
-                'completed_files': completed_count,
-                'processing_files': processing_count,
-                'pending_files': pending_count
-            })
+        # 已处理的文件数量（包括完成、失败）
+        processed_count = completed_count + failed_count
 
-            logger.info(f"批量任务进度更新: {batch_job.id} - {processed_count}/{total_files} ({progress_percentage:.1f}%)")
+        # 更新统计
+        now = timezone.now()
+        stats = {
+            'total_files': total_files,
+            'processed_files': processed_count,
+            'failed_files': failed_count,
+            'updated_at': now
+        }
+
+        # 计算预计完成时间
+        if job_state['started_at'] and processed_count > 0:
+            elapsed_time = (now - job_state['started_at']).total_seconds()
+            avg_time_per_file = elapsed_time / processed_count
+            remaining_files = total_files - processed_count
+
+            if remaining_files > 0:
+                estimated_remaining_time = avg_time_per_file * remaining_files
+                stats['estimated_completion'] = now + timedelta(seconds=estimated_remaining_time)
+
+        # 并发调用基于不同时刻的快照统计，后写入的不一定更新：
+        # 只允许已处理数不减少的写入，避免较旧的统计覆盖较新的（如 7 -> 6）
+        BatchJob.objects.filter(id=batch_job_id, processed_files__lte=processed_count).update(**stats)
+        status = job_state['status']
+
+        # 检查是否所有文件都处理完成
+        if processed_count == total_files and processing_count == 0 and status == 'running':
+            # 条件更新：并发完成时只有一个调用方能把任务切换为完成并发送通知
+            if BatchJob.objects.filter(id=batch_job_id, status='running').update(status='completed', completed_at=now):
+                status = 'completed'
+
+                # 发送任务完成通知
+                send_batch_job_completed(batch_job_id, {
+                    'batch_job_id': batch_job_id,
+                    'status': 'completed',
+                    'total_files': total_files,
+                    'processed_files': processed_count,
+                    'failed_files': failed_count,
+                    'completed_files': completed_count
+                })
+
+        # 发送进度更新
+        progress_percentage = (processed_count / total_files) * 100 if total_files else 0
+        send_batch_progress_update(batch_job_id, {
+            'batch_job_id': batch_job_id,
+            'progress_percentage': progress_percentage,
+            'processed_files': processed_count,
+            'failed_files': failed_count,
+            'status': status,
+            'total_files': total_files,
+            'completed_files': completed_count,
+            'processing_files': processing_count,
+            'pending_files': pending_count
+        })
+
+        logger.info(f"批量任务进度更新: {batch_job_id} - {processed_count}/{total_files} ({progress_percentage:.1f}%)")
 
     except Exception as e:
         logger.error(f"更新批量任务统计失败: {e}", exc_info=True)
@@ -657,17 +800,26 @@ def retry_failed_items(batch_job_id):
             status='failed'
         )
         
-        if not failed_items.exists():
+        # 重置失败项状态（update 返回受影响行数，即重试数量）
+        retry_count = failed_items.update(
+            status='pending',
+            error_message='',
+            processing_time_seconds=None
+        )
+        
+        if not retry_count:
             return {
                 'status': 'no_failed_items',
                 'message': '没有失败的文件需要重试'
             }
         
-        # 重置失败项状态
-        failed_items.update(
-            status='pending',
-            error_message='',
-            processing_time_seconds=None
+        # 失败项回到待处理后已处理数会减少，直接写入重新统计的值
+        # （update_batch_job_stats 只接受已处理数不减少的写入）
+        status_counts = _count_items_by_status(batch_job_id)
+        BatchJob.objects.filter(id=batch_job_id).update(
+            processed_files=status_counts.get('completed', 0) + status_counts.get('failed', 0),
+            failed_files=status_counts.get('failed', 0),
+            updated_at=timezone.now()
         )
         
         # 重新启动批量处理
@@ -676,7 +828,7 @@ def retry_failed_items(batch_job_id):
         return {
             'status': 'retry_started',
             'batch_job_id': batch_job_id,
-            'retry_count': failed_items.count(),
+            'retry_count': retry_count,
             'task_id': result.id
         }
         
@@ -4,9 +4,10 @@
 基于GUI项目的实际业务场景设计，验证批量处理功能与原程序的一致性
 """
 import os
+import json
 import tempfile
-from unittest.mock import patch, Mock, MagicMock
-from django.test import TestCase, override_settings
+from unittest.mock import patch, AsyncMock, Mock, MagicMock
+from django.test import SimpleTestCase, TestCase, override_settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.contrib.auth import get_user_model
 from django.utils import timezone
@@ -368,3 +369,502 @@ class BatchProcessingTestCase(TestCase):
         file_item = BatchFileItem.objects.filter(batch_job=self.batch_job).first()
         expected_str = f"{self.batch_job.name} - {file_item.file.original_name}"
         self.assertEqual(str(file_item), expected_str)
+    
+    def test_create_serializer_rejects_non_image_files(self):
+        """测试创建批量任务时拒绝非图片文件"""
+        from apps.batch.serializers import BatchJobCreateSerializer
+        
+        document = UploadedFile.objects.create(
+            file=SimpleUploadedFile('report.pdf', b'%PDF-1.4', content_type='application/pdf'),
+            original_name='report.pdf',
+            file_size=8,
+            file_type='pdf',
+            mime_type='application/pdf',
+            hash_md5='test_hash_pdf',
+            created_by=self.user
+        )
+        file_ids = [f.id for f in self.test_images] + [document.id]
+        
+        serializer = BatchJobCreateSerializer(
+            data={'name': '混合文件任务', 'file_ids': file_ids},
+            context={'request': Mock(user=self.user)}
+        )
+        
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('report.pdf', str(serializer.errors['file_ids']))
+        
+        serializer = BatchJobCreateSerializer(
+            data={'name': '图片任务', 'file_ids': [f.id for f in self.test_images]},
+            context={'request': Mock(user=self.user)}
+        )
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+
+
+LOCMEM_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'batch-rate-limiter-tests',
+    }
+}
+
+
+class RateLimiterTestCase(TestCase):
+    """批量OCR限流器测试用例"""
+    
+    def setUp(self):
+        # 用可控的时钟代替真实时间，sleep 直接推进时钟
+        self.clock = [1000.0]
+        patcher = patch('apps.batch.services.time')
+        self.mock_time = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.mock_time.time.side_effect = lambda: self.clock[0]
+        self.mock_time.sleep.side_effect = self.advance_clock
+    
+    def advance_clock(self, seconds):
+        self.clock[0] += seconds
+    
+    @override_settings(CACHES=LOCMEM_CACHES)
+    def test_waits_for_next_window_when_limit_reached(self):
+        """测试窗口内调用数达到上限时等待到下一个窗口"""
+        from apps.batch.services import RateLimiter
+        
+        limiter = RateLimiter(max_calls=2, period=1)
+        limiter.acquire('test')
+        limiter.acquire('test')
+        self.mock_time.sleep.assert_not_called()
+        
+        limiter.acquire('test')
+        self.mock_time.sleep.assert_called_once_with(1.0)
+        self.assertEqual(self.clock[0], 1001.0)
+    
+    def test_fails_open_when_cache_does_not_store_counter(self):
+        """测试缓存不保存计数（DummyCache）时直接放行，不会无限重试"""
+        from apps.batch.services import RateLimiter, RATE_LIMIT_MAX_RETRIES
+        
+        limiter = RateLimiter(max_calls=1, period=1)
+        with patch('apps.batch.services.cache.incr', side_effect=ValueError) as mock_incr:
+            limiter.acquire('test')
+            limiter.acquire('test')
+        
+        self.assertEqual(mock_incr.call_count, 2 * RATE_LIMIT_MAX_RETRIES)
+        self.mock_time.sleep.assert_not_called()
+    
+    @override_settings(CACHES=LOCMEM_CACHES)
+    def test_fails_open_when_cache_unavailable(self):
+        """测试缓存服务不可用时直接放行"""
+        from apps.batch.services import RateLimiter
+        
+        limiter = RateLimiter(max_calls=1, period=1)
+        with patch('apps.batch.services.cache.add', side_effect=ConnectionError('cache down')):
+            limiter.acquire('test')
+        
+        self.mock_time.sleep.assert_not_called()
+
+
+@patch('apps.batch.tasks.ws_send_completed', Mock())
+@patch('apps.batch.tasks.ws_send_file', Mock())
+@patch('apps.batch.tasks.ws_send_progress', Mock())
+class BatchOrchestrationTestCase(TestCase):
+    """批量任务编排测试用例（任务组分发、chord 收尾、空白页跳过）"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='batchuser',
+            email='batch@example.com',
+            password='testpass123'
+        )
+        self.batch_job = BatchJob.objects.create(
+            name='编排测试任务',
+            total_files=3,
+            status='running',
+            started_at=timezone.now(),
+            created_by=self.user
+        )
+        self.items = []
+        for i in range(3):
+            uploaded_file = UploadedFile.objects.create(
+                file=self.create_test_image(f'page_{i}.jpg'),
+                original_name=f'page_{i}.jpg',
+                file_size=1024,
+                file_type='image',
+                mime_type='image/jpeg',
+                hash_md5=f'orchestration_hash_{i}',
+                created_by=self.user
+            )
+            self.items.append(BatchFileItem.objects.create(
+                batch_job=self.batch_job,
+                file=uploaded_file,
+                processing_order=i,
+                created_by=self.user
+            ))
+    
+    def create_test_image(self, filename, dark_box=None):
+        """创建白底测试图片，dark_box 为需要涂黑的区域"""
+        image = Image.new('RGB', (800, 600), color='white')
+        if dark_box:
+            image.paste((0, 0, 0), dark_box)
+        image_io = io.BytesIO()
+        image.save(image_io, format='JPEG')
+        return SimpleUploadedFile(
+            name=filename,
+            content=image_io.getvalue(),
+            content_type='image/jpeg'
+        )
+    
+    def test_dispatch_builds_chord_with_finalize_callback(self):
+        """测试任务组分发以 finalize_batch 作为 chord 回调"""
+        from apps.batch.tasks import dispatch_batch_items, finalize_batch
+        
+        item_ids = [item.id for item in self.items]
+        with patch('apps.batch.tasks.chord') as mock_chord:
+            dispatch_batch_items(self.batch_job.id, item_ids)
+        
+        header = mock_chord.call_args[0][0]
+        self.assertEqual([task.args[0] for task in header.tasks], item_ids)
+        mock_chord.return_value.assert_called_once_with(finalize_batch.s(self.batch_job.id))
+    
+    def test_finalize_batch_sets_final_status(self):
+        """测试 chord 回调在所有文件项结束后设置任务最终状态（有失败项时同样为完成，失败数单独统计）"""
+        from apps.batch.tasks import finalize_batch
+        
+        BatchFileItem.objects.filter(id__in=[self.items[0].id, self.items[1].id]).update(status='completed')
+        BatchFileItem.objects.filter(id=self.items[2].id).update(status='failed')
+        
+        result = finalize_batch([], self.batch_job.id)
+        
+        self.batch_job.refresh_from_db()
+        self.assertEqual(self.batch_job.status, 'completed')
+        self.assertIsNotNone(self.batch_job.completed_at)
+        self.assertEqual(self.batch_job.processed_files, 3)
+        self.assertEqual(self.batch_job.failed_files, 1)
+        self.assertEqual(result['status'], 'completed')
+    
+    def test_stats_update_does_not_move_counts_backwards(self):
+        """测试较旧的统计快照不会覆盖已写入的较新计数"""
+        from apps.batch.tasks import update_batch_job_stats
+        
+        BatchFileItem.objects.filter(id=self.items[0].id).update(status='completed')
+        BatchJob.objects.filter(id=self.batch_job.id).update(processed_files=2)
+        
+        update_batch_job_stats(self.batch_job.id)
+        
+        self.batch_job.refresh_from_db()
+        self.assertEqual(self.batch_job.processed_files, 2)
+    
+    def test_process_batch_item_skips_cancelled_item(self):
+        """测试已标记为跳过的文件项不再调用OCR"""
+        from apps.batch.tasks import process_batch_item
+        
+        item = self.items[0]
+        BatchFileItem.objects.filter(id=item.id).update(status='skipped')
+        
+        with patch('apps.batch.tasks.run_file_ocr') as mock_ocr:
+            result = process_batch_item.apply(args=(item.id, self.batch_job.id)).get()
+        
+        self.assertEqual(result['status'], 'skipped')
+        mock_ocr.assert_not_called()
+    
+    def test_failed_item_waits_for_retry_as_pending(self):
+        """测试重试前文件项回到待处理，最后一个文件项失败不会提前完成批量任务"""
+        from celery.exceptions import Retry
+        from apps.batch.tasks import process_batch_item
+        
+        BatchFileItem.objects.filter(id__in=[self.items[0].id, self.items[1].id]).update(status='completed')
+        item = self.items[2]
+        
+        with patch('apps.batch.tasks.run_file_ocr', return_value={'status': 'error', 'error': '接口错误'}), \
+                patch('apps.batch.tasks.send_batch_job_completed') as mock_completed, \
+                patch.object(process_batch_item, 'retry', side_effect=Retry()) as mock_retry:
+            with self.assertRaises(Retry):
+                process_batch_item.apply(args=(item.id, self.batch_job.id))
+        
+        mock_retry.assert_called_once()
+        mock_completed.assert_not_called()
+        item.refresh_from_db()
+        self.assertEqual(item.status, 'pending')
+        self.assertEqual(item.error_message, '接口错误')
+        self.batch_job.refresh_from_db()
+        self.assertEqual(self.batch_job.status, 'running')
+    
+    def test_item_marked_failed_after_last_retry(self):
+        """测试重试次数用尽后文件项标记为失败并重新统计"""
+        from apps.batch.tasks import process_batch_item
+        
+        BatchFileItem.objects.filter(id__in=[self.items[0].id, self.items[1].id]).update(status='completed')
+        item = self.items[2]
+        
+        with patch('apps.batch.tasks.run_file_ocr', return_value={'status': 'error', 'error': '接口错误'}):
+            result = process_batch_item.apply(
+                args=(item.id, self.batch_job.id), retries=process_batch_item.max_retries
+            ).get()
+        
+        self.assertEqual(result['status'], 'error')
+        item.refresh_from_db()
+        self.assertEqual(item.status, 'failed')
+        self.batch_job.refresh_from_db()
+        self.assertEqual(self.batch_job.status, 'completed')
+        self.assertEqual(self.batch_job.failed_files, 1)
+    
+    @patch('apps.ocr.tasks.single_ocr_process', return_value={'check_type': 'initial'})
+    def test_batch_ocr_leaves_item_bookkeeping_to_caller(self, mock_ocr):
+        """测试批量处理调用OCR时只写OCR结果，文件项由批量任务自行更新"""
+        from apps.ocr.tasks import process_image_ocr_sync
+        
+        item = self.items[0]
+        BatchFileItem.objects.filter(id=item.id).update(status='processing')
+        
+        result = process_image_ocr_sync(item.file_id, self.user.id, update_batch_items=False)
+        
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(OCRResult.objects.get(id=result['ocr_result_id']).status, 'completed')
+        item.refresh_from_db()
+        self.assertEqual(item.status, 'processing')
+        self.assertIsNone(item.ocr_result)
+    
+    def test_run_file_ocr_timeout_cancels_worker_thread(self):
+        """测试单个文件OCR超时后抛出 TimeoutError，并通知工作线程丢弃结果"""
+        from apps.batch.services import run_file_ocr
+        
+        calls = []
+        
+        def slow_ocr(*args, **kwargs):
+            calls.append(kwargs)
+            kwargs['cancel_event'].wait(5)
+            return {'status': 'error'}
+        
+        with patch('apps.batch.services.BATCH_FILE_OCR_TIMEOUT', 0.05), \
+                patch('apps.ocr.tasks.process_image_ocr_sync', side_effect=slow_ocr):
+            with self.assertRaises(TimeoutError):
+                run_file_ocr(self.items[0].file_id, self.user.id)
+        
+        self.assertFalse(calls[0]['update_batch_items'])
+        self.assertTrue(calls[0]['cancel_event'].is_set())
+    
+    @patch('apps.ocr.tasks.single_ocr_process', return_value={'phone': '13800000000'})
+    def test_timed_out_ocr_discards_late_result(self, mock_ocr):
+        """测试调用方超时放弃后，晚到的OCR结果不会写入"""
+        import threading
+        from apps.ocr.tasks import process_image_ocr_sync
+        
+        cancel_event = threading.Event()
+        cancel_event.set()
+        
+        result = process_image_ocr_sync(
+            self.items[0].file_id, self.user.id,
+            update_batch_items=False, cancel_event=cancel_event
+        )
+        
+        self.assertEqual(result['status'], 'error')
+        ocr_result = OCRResult.objects.get(id=result['ocr_result_id'])
+        self.assertEqual(ocr_result.status, 'processing')
+        self.assertEqual(ocr_result.phone, '')
+    
+    def test_process_batch_item_skips_when_job_cancelled(self):
+        """测试批量任务取消后，处理中或等待重试的文件项不再调用OCR"""
+        from apps.batch.tasks import process_batch_item
+        
+        item = self.items[0]
+        BatchFileItem.objects.filter(id=item.id).update(status='processing')
+        BatchJob.objects.filter(id=self.batch_job.id).update(status='cancelled')
+        
+        with patch('apps.batch.tasks.run_file_ocr') as mock_ocr:
+            result = process_batch_item.apply(args=(item.id, self.batch_job.id)).get()
+        
+        self.assertEqual(result['status'], 'skipped')
+        mock_ocr.assert_not_called()
+        item.refresh_from_db()
+        self.assertEqual(item.status, 'skipped')
+    
+    def test_no_retry_after_job_cancelled(self):
+        """测试OCR失败时批量任务已取消则不再安排重试"""
+        from apps.batch.tasks import process_batch_item
+        
+        item = self.items[0]
+        
+        def cancel_during_ocr(*args, **kwargs):
+            BatchJob.objects.filter(id=self.batch_job.id).update(status='cancelled')
+            return {'status': 'error', 'error': '接口错误'}
+        
+        with patch('apps.batch.tasks.run_file_ocr', side_effect=cancel_during_ocr), \
+                patch.object(process_batch_item, 'retry') as mock_retry:
+            result = process_batch_item.apply(args=(item.id, self.batch_job.id)).get()
+        
+        mock_retry.assert_not_called()
+        self.assertEqual(result['status'], 'skipped')
+        item.refresh_from_db()
+        self.assertEqual(item.status, 'skipped')
+    
+    def test_finalize_batch_completes_job_with_skipped_items(self):
+        """测试有跳过的文件项时由 chord 回调把任务标记为完成并通知"""
+        from apps.batch.tasks import finalize_batch
+        
+        BatchFileItem.objects.filter(id__in=[self.items[0].id, self.items[1].id]).update(status='completed')
+        BatchFileItem.objects.filter(id=self.items[2].id).update(status='skipped')
+        
+        with patch('apps.batch.tasks.send_batch_job_completed') as mock_completed:
+            finalize_batch([], self.batch_job.id)
+        
+        self.batch_job.refresh_from_db()
+        self.assertEqual(self.batch_job.status, 'completed')
+        self.assertIsNotNone(self.batch_job.completed_at)
+        mock_completed.assert_called_once()
+    
+    def test_finalize_batch_keeps_cancelled_status(self):
+        """测试已取消的批量任务收尾时保持取消状态"""
+        from apps.batch.tasks import finalize_batch
+        
+        BatchJob.objects.filter(id=self.batch_job.id).update(status='cancelled')
+        
+        finalize_batch([], self.batch_job.id)
+        
+        self.batch_job.refresh_from_db()
+        self.assertEqual(self.batch_job.status, 'cancelled')
+    
+    def test_tasks_flush_buffered_updates_before_returning(self):
+        """测试批量子任务与收尾任务返回前立即发送缓冲的WebSocket消息"""
+        from apps.batch.tasks import finalize_batch, process_batch_item
+        
+        with patch('apps.batch.tasks.ws_flush_updates') as mock_flush, \
+                patch('apps.batch.tasks.run_file_ocr', return_value={'status': 'success'}):
+            process_batch_item.apply(args=(self.items[0].id, self.batch_job.id)).get()
+            self.assertEqual(mock_flush.call_count, 1)
+            
+            finalize_batch([], self.batch_job.id)
+            self.assertEqual(mock_flush.call_count, 2)
+    
+    def test_is_blank_image(self):
+        """测试空白页判定：纯白页为空白，有深色内容的页面不是"""
+        from apps.batch.services import is_blank_image
+        
+        blank = self.items[0].file
+        self.assertTrue(is_blank_image(blank.file.path))
+        
+        content = UploadedFile.objects.create(
+            file=self.create_test_image('content.jpg', dark_box=(100, 100, 400, 300)),
+            original_name='content.jpg',
+            file_size=1024,
+            file_type='image',
+            mime_type='image/jpeg',
+            hash_md5='orchestration_hash_content',
+            created_by=self.user
+        )
+        self.assertFalse(is_blank_image(content.file.path))
+    
+    @patch.dict(os.environ, {'REPL_DEPLOYMENT': '1'})
+    @patch('apps.batch.tasks.single_ocr_process')
+    def test_deployment_processing_skips_blank_pages(self, mock_ocr):
+        """测试部署环境同步处理时空白页直接跳过，不调用OCR接口"""
+        from apps.batch.tasks import start_batch_ocr_processing
+        
+        start_batch_ocr_processing(self.batch_job.id)
+        
+        mock_ocr.assert_not_called()
+        self.assertFalse(OCRResult.objects.filter(file__in=[item.file for item in self.items]).exists())
+        statuses = set(BatchFileItem.objects.filter(batch_job=self.batch_job).values_list('status', flat=True))
+        self.assertEqual(statuses, {'skipped'})
+        
+        self.batch_job.refresh_from_db()
+        self.assertEqual(self.batch_job.status, 'completed')
+        self.assertEqual(self.batch_job.processed_files, 3)
+
+
+class BatchWebSocketTestCase(SimpleTestCase):
+    """批量处理 WebSocket 推送测试用例（消息合并与 MessagePack 子协议）"""
+    
+    def tearDown(self):
+        from apps.batch import consumers
+        consumers._pending_updates.clear()
+    
+    def test_flush_coalesces_buffered_updates_per_job(self):
+        """测试同一周期内的消息合并为一次 group_send，进度只保留最新一条"""
+        from apps.batch import consumers
+        
+        with patch('apps.batch.consumers._group_send') as mock_send:
+            consumers.send_batch_progress_update(1, {'batch_job_id': 1, 'processed_files': 1})
+            consumers.send_file_processing_update(1, {'batch_job_id': 1, 'file_id': 10})
+            consumers.send_batch_progress_update(1, {'batch_job_id': 1, 'processed_files': 2})
+            consumers.send_file_processing_update(2, {'batch_job_id': 2, 'file_id': 20})
+            consumers.flush_batch_updates()
+        
+        sent = {call.args[0]: call.args[1] for call in mock_send.call_args_list}
+        self.assertEqual(set(sent), {1, 2})
+        
+        bulk = sent[1]
+        self.assertEqual(bulk['type'], 'batch_updates_bulk')
+        self.assertEqual(
+            [(event['type'], event['data']) for event in bulk['events']],
+            [
+                ('file_processing_update', {'batch_job_id': 1, 'file_id': 10}),
+                ('batch_progress_update', {'batch_job_id': 1, 'processed_files': 2}),
+            ]
+        )
+        # 单条消息不包装
+        self.assertEqual(sent[2]['type'], 'file_processing_update')
+    
+    def test_completion_flushes_pending_updates_first(self):
+        """测试完成消息与缓冲中的消息一起立即发送，且排在最后"""
+        from apps.batch import consumers
+        
+        with patch('apps.batch.consumers._group_send') as mock_send:
+            consumers.send_batch_progress_update(1, {'batch_job_id': 1, 'processed_files': 3})
+            consumers.send_batch_job_completed(1, {'batch_job_id': 1})
+        
+        mock_send.assert_called_once()
+        events = mock_send.call_args.args[1]['events']
+        self.assertEqual(
+            [event['type'] for event in events],
+            ['batch_progress_update', 'batch_job_completed']
+        )
+    
+    async def test_consumer_outbox_keeps_latest_progress(self):
+        """测试订阅者积压的消息一次取出，同一任务的进度只发送最新一条"""
+        import asyncio
+        from apps.batch.consumers import BatchProcessingConsumer, _build_group_event
+        
+        consumer = BatchProcessingConsumer()
+        consumer.send = AsyncMock()
+        consumer._outbox = asyncio.Queue()
+        
+        for event in (
+            _build_group_event('batch_progress_update', {'batch_job_id': 1, 'processed_files': 1}),
+            _build_group_event('file_processing_update', {'batch_job_id': 1, 'file_id': 10}),
+            _build_group_event('batch_progress_update', {'batch_job_id': 1, 'processed_files': 2}),
+        ):
+            await consumer._forward_group_event(event)
+        
+        writer = asyncio.ensure_future(consumer._drain_outbox())
+        for _ in range(5):
+            await asyncio.sleep(0)
+        writer.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await writer
+        
+        frames = [json.loads(call.kwargs['text_data']) for call in consumer.send.await_args_list]
+        self.assertEqual(
+            [(frame['type'], frame['data']) for frame in frames],
+            [
+                ('file_processing_update', {'batch_job_id': 1, 'file_id': 10}),
+                ('batch_progress_update', {'batch_job_id': 1, 'processed_files': 2}),
+            ]
+        )
+    
+    async def test_msgpack_subprotocol_sends_binary_frames(self):
+        """测试协商 MessagePack 子协议后群组消息以二进制帧转发"""
+        import msgpack
+        from apps.batch.consumers import BatchProcessingConsumer, _build_group_event
+        
+        consumer = BatchProcessingConsumer()
+        consumer.send = AsyncMock()
+        consumer.use_msgpack = True
+        
+        data = {'batch_job_id': 1, 'file_id': 10, 'status': 'completed'}
+        event = _build_group_event('file_processing_update', data)
+        self.assertNotIn('cached_msgpack', event)
+        await consumer._forward_group_event(event)
+        
+        frame = consumer.send.await_args.kwargs['bytes_data']
+        payload = msgpack.unpackb(frame, raw=False)
+        self.assertEqual(payload['type'], 'file_processing_update')
+        self.assertEqual(payload['data'], data)
+        # 与 JSON 订阅者收到的帧使用同一时间戳
+        self.assertEqual(payload['timestamp'], json.loads(event['cached'])['timestamp'])
@@ -2,7 +2,9 @@
 批量处理视图
 """
 import os
+from collections import Counter
 from django.db import transaction
+from django.db.models import Prefetch
 from django.utils import timezone
 from django.core.files.storage import default_storage
 from rest_framework import viewsets, status
@@ -25,6 +27,15 @@ from .serializers import (
 from apps.files.models import UploadedFile
 
 
+# BatchJobSerializer 嵌套输出的文件项：文件、OCR结果及其文件与联系人一次 JOIN 取回
+FILE_ITEMS_PREFETCH = Prefetch(
+    'batchfileitem_set',
+    queryset=BatchFileItem.objects.select_related(
+        'file', 'ocr_result', 'ocr_result__file', 'ocr_result__contactinfo'
+    ).order_by('processing_order')
+)
+
+
 class BatchJobViewSet(viewsets.ModelViewSet):
     """批量任务管理视图集"""
     queryset = BatchJob.objects.all()
@@ -40,11 +51,7 @@ class BatchJobViewSet(viewsets.ModelViewSet):
         if status_filter:
             queryset = queryset.filter(status=status_filter)
 
-        return queryset.prefetch_related(
-            'batchfileitem_set__file',
-            'batchfileitem_set__ocr_result',
-            'batchfileitem_set__ocr_result__contactinfo'
-        ).order_by('-created_at')
+        return queryset.prefetch_related(FILE_ITEMS_PREFETCH).order_by('-created_at')
 
     def get_serializer_class(self):
         """根据动作选择序列化器"""
@@ -185,28 +192,24 @@ class BatchJobViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'])
     def progress(self, request, pk=None):
         """获取任务进度（包含文件详情）"""
+        # get_object() 的查询集已预取文件项，本次请求中即为最新状态
         batch_job = self.get_object()
 
-        # 刷新任务状态
-        batch_job.refresh_from_db()
-
-        # 获取文件项的详细信息
-        file_items = batch_job.batchfileitem_set.select_related(
-            'file', 'ocr_result'
-        ).order_by('processing_order')
-
         # 构建响应数据
         serializer = BatchJobSerializer(batch_job)
         response_data = serializer.data
 
+        # 实时统计直接按预取的文件项计数，不再逐个状态查询
+        status_counts = Counter(item.status for item in batch_job.batchfileitem_set.all())
+
         # 添加实时统计信息
         response_data.update({
             'real_time_stats': {
-                'pending_count': file_items.filter(status='pending').count(),
-                'processing_count': file_items.filter(status='processing').count(),
-                'completed_count': file_items.filter(status='completed').count(),
-                'failed_count': file_items.filter(status='failed').count(),
-                'skipped_count': file_items.filter(status='skipped').count(),
+                'pending_count': status_counts['pending'],
+                'processing_count': status_counts['processing'],
+                'completed_count': status_counts['completed'],
+                'failed_count': status_counts['failed'],
+                'skipped_count': status_counts['skipped'],
             },
             'can_start': batch_job.status in ['pending', 'failed'],
             'can_cancel': batch_job.status == 'running',
@@ -270,14 +273,16 @@ class BatchJobViewSet(viewsets.ModelViewSet):
                 'error': '没有失败的文件需要重试'
             }, status=status.HTTP_404_NOT_FOUND)
 
-        # 重置失败文件的状态
-        failed_items.update(
+        # 重置失败文件的状态（update 返回重试数量，之后 failed_items 已为空）
+        retry_count = failed_items.update(
             status='pending',
             error_message='',
             processing_time_seconds=None
         )
 
-        # 更新批量任务状态
+        # 更新批量任务状态：重试的文件不再计入已处理数
+        # （update_batch_job_stats 只接受已处理数不减少的写入）
+        batch_job.processed_files = max(batch_job.processed_files - retry_count, 0)
         batch_job.failed_files = 0
         batch_job.status = 'running'
         batch_job.save()
@@ -286,9 +291,9 @@ class BatchJobViewSet(viewsets.ModelViewSet):
         # task = retry_failed_items.delay(batch_job.id)
 
         return Response({
-            'message': f'开始重试 {failed_items.count()} 个失败的文件',
+            'message': f'开始重试 {retry_count} 个失败的文件',
             'batch_job_id': batch_job.id,
-            'retry_count': failed_items.count(),
+            'retry_count': retry_count,
             # 'task_id': task.id,
             'status': 'running'
         }, status=status.HTTP_202_ACCEPTED)
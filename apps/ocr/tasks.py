@@ -639,7 +639,8 @@ def cleanup_failed_ocr_results():
     return f"清理了 {count} 个失败的OCR结果"
 
 
-def process_image_ocr_sync(file_id, user_id, use_multi_ocr=False, ocr_count=3):
+def process_image_ocr_sync(file_id, user_id, use_multi_ocr=False, ocr_count=3, force_reprocess=False,
+                           update_batch_items=True, cancel_event=None):
     """
     同步处理图片OCR任务（用于Replit等环境）
     
@@ -648,6 +649,11 @@ def process_image_ocr_sync(file_id, user_id, use_multi_ocr=False, ocr_count=3):
         user_id: 用户ID
         use_multi_ocr: 是否使用多重OCR
         ocr_count: OCR次数
+        force_reprocess: 是否强制重新处理（不使用已有OCR结果）
+        update_batch_items: 是否同步更新处理中的批量文件项及批量任务统计；
+            批量任务自行维护文件项状态时传 False
+        cancel_event: 调用方放弃等待时置位的 threading.Event，
+            置位后OCR接口返回的结果直接丢弃，不再写入数据库
     
     Returns:
         dict: 处理结果
@@ -659,6 +665,11 @@ def process_image_ocr_sync(file_id, user_id, use_multi_ocr=False, ocr_count=3):
         file_obj = UploadedFile.objects.get(id=file_id)
         ocr_result = OCRResult.objects.filter(file=file_obj).first()
         
+        # 如果强制重新处理，删除现有的OCR结果
+        if force_reprocess and ocr_result:
+            ocr_result.delete()
+            ocr_result = None
+        
         if not ocr_result:
             ocr_result = OCRResult.objects.create(
                 file=file_obj,
@@ -688,6 +699,15 @@ def process_image_ocr_sync(file_id, user_id, use_multi_ocr=False, ocr_count=3):
         
         logger.info(f"OCR处理结果: {result}")
         
+        # 调用方已超时放弃（可能已安排重试）：丢弃结果，避免晚到的结果覆盖重试写入的数据
+        if cancel_event is not None and cancel_event.is_set():
+            logger.warning(f"OCR处理已超时，丢弃结果: file_id={file_id}")
+            return {
+                'status': 'error',
+                'error': 'OCR处理已超时，结果已丢弃',
+                'ocr_result_id': ocr_result.id
+            }
+        
         # 更新OCR结果
         ocr_result.status = 'completed'
         ocr_result.phone = result.get('phone', '')
@@ -723,34 +743,35 @@ def process_image_ocr_sync(file_id, user_id, use_multi_ocr=False, ocr_count=3):
         file_obj.save()
 
         # 更新关联的批量文件项状态
-        try:
-            from apps.batch.models import BatchFileItem
-            batch_file_items = BatchFileItem.objects.filter(
-                file=file_obj,
-                status='processing'
-            )
+        if update_batch_items:
+            try:
+                from apps.batch.models import BatchFileItem
+                batch_file_items = BatchFileItem.objects.filter(
+                    file=file_obj,
+                    status='processing'
+                )
 
-            processing_time = (timezone.now() - ocr_result.processing_started_at).total_seconds() if ocr_result.processing_started_at else 1.0
+                processing_time = (timezone.now() - ocr_result.processing_started_at).total_seconds() if ocr_result.processing_started_at else 1.0
 
-            for batch_item in batch_file_items:
-                batch_item.status = 'completed'
-                batch_item.ocr_result = ocr_result
-                batch_item.processing_time_seconds = max(processing_time, 1.0)
-                batch_item.save()
+                for batch_item in batch_file_items:
+                    batch_item.status = 'completed'
+                    batch_item.ocr_result = ocr_result
+                    batch_item.processing_time_seconds = max(processing_time, 1.0)
+                    batch_item.save()
 
-                logger.info(f"已更新批量文件项状态: {batch_item.id} -> completed")
+                    logger.info(f"已更新批量文件项状态: {batch_item.id} -> completed")
 
-                # 更新批量任务进度
-                try:
-                    from apps.batch.tasks import update_batch_job_stats
-                    update_batch_job_stats(batch_item.batch_job.id)
-                    logger.info(f"已更新批量任务进度: {batch_item.batch_job.id}")
-                except Exception as progress_error:
-                    logger.error(f"更新批量任务进度失败: {progress_error}")
+                    # 更新批量任务进度
+                    try:
+                        from apps.batch.tasks import update_batch_job_stats
+                        update_batch_job_stats(batch_item.batch_job.id)
+                        logger.info(f"已更新批量任务进度: {batch_item.batch_job.id}")
+                    except Exception as progress_error:
+                        logger.error(f"更新批量任务进度失败: {progress_error}")
 
-        except Exception as batch_error:
-            logger.warning(f"更新批量文件项状态失败: {batch_error}")
-            # 不影响主要的OCR处理流程
+            except Exception as batch_error:
+                logger.warning(f"更新批量文件项状态失败: {batch_error}")
+                # 不影响主要的OCR处理流程
 
         return {
             'status': 'success',
@@ -764,41 +785,43 @@ def process_image_ocr_sync(file_id, user_id, use_multi_ocr=False, ocr_count=3):
     except Exception as e:
         logger.error(f"同步OCR处理失败: {str(e)}", exc_info=True)
 
-        # 更新错误状态
-        if 'ocr_result' in locals():
+        # 更新错误状态（调用方已超时放弃时不再写入）
+        cancelled = cancel_event is not None and cancel_event.is_set()
+        if 'ocr_result' in locals() and not cancelled:
             ocr_result.status = 'failed'
             ocr_result.error_message = str(e)
             ocr_result.processing_completed_at = timezone.now()
             ocr_result.save()
 
             # 更新关联的批量文件项状态为失败
-            try:
-                from apps.batch.models import BatchFileItem
-                batch_file_items = BatchFileItem.objects.filter(
-                    file_id=file_id,
-                    status='processing'
-                )
-
-                processing_time = (timezone.now() - ocr_result.processing_started_at).total_seconds() if ocr_result.processing_started_at else 1.0
-
-                for batch_item in batch_file_items:
-                    batch_item.status = 'failed'
-                    batch_item.error_message = str(e)
-                    batch_item.processing_time_seconds = max(processing_time, 1.0)
-                    batch_item.save()
-
-                    logger.info(f"已更新批量文件项状态: {batch_item.id} -> failed")
-
-                    # 更新批量任务进度
-                    try:
-                        from apps.batch.tasks import update_batch_job_stats
-                        update_batch_job_stats(batch_item.batch_job.id)
-                        logger.info(f"已更新批量任务进度: {batch_item.batch_job.id}")
-                    except Exception as progress_error:
-                        logger.error(f"更新批量任务进度失败: {progress_error}")
-
-            except Exception as batch_error:
-                logger.warning(f"更新批量文件项状态失败: {batch_error}")
+            if update_batch_items:
+                try:
+                    from apps.batch.models import BatchFileItem
+                    batch_file_items = BatchFileItem.objects.filter(
+                        file_id=file_id,
+                        status='processing'
+                    )
+
+                    processing_time = (timezone.now() - ocr_result.processing_started_at).total_seconds() if ocr_result.processing_started_at else 1.0
+
+                    for batch_item in batch_file_items:
+                        batch_item.status = 'failed'
+                        batch_item.error_message = str(e)
+                        batch_item.processing_time_seconds = max(processing_time, 1.0)
+                        batch_item.save()
+
+                        logger.info(f"已更新批量文件项状态: {batch_item.id} -> failed")
+
+                        # 更新批量任务进度
+                        try:
+                            from apps.batch.tasks import update_batch_job_stats
+                            update_batch_job_stats(batch_item.batch_job.id)
+                            logger.info(f"已更新批量任务进度: {batch_item.batch_job.id}")
+                        except Exception as progress_error:
+                            logger.error(f"更新批量任务进度失败: {progress_error}")
+
+                except Exception as batch_error:
+                    logger.warning(f"更新批量文件项状态失败: {batch_error}")
 
         return {
             'status': 'error',
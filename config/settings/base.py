@@ -235,6 +235,9 @@ OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL', 'https://api.openai.com/v1')
 OPENAI_MODEL_NAME = os.getenv('OPENAI_MODEL_NAME', 'gpt-4-vision-preview')
 
+# AI配置文件写入后是否 fsync（默认关闭，仅依赖原子替换）
+AI_CONFIG_DURABLE_WRITE = os.getenv('AI_CONFIG_DURABLE_WRITE', 'False').lower() == 'true'
+
 # 超时配置
 API_TIMEOUT_SECONDS = int(os.getenv('API_TIMEOUT_SECONDS', '30'))
 OCR_TIMEOUT_SECONDS = int(os.getenv('OCR_TIMEOUT_SECONDS', '60'))